@@ -0,0 +1,85 @@
+"use strict";
+
+// Generates a synthetic program and measures how long the editor takes to
+// load it, to re-render it, to apply edits and to scroll through it.
+
+function generateProgram(trackCount, snippetsPerTrack) {
+	let tracks = [];
+	for (let trackIndex = 0; trackIndex < trackCount; trackIndex++) {
+		let snippets = [];
+		for (let snippetIndex = 0; snippetIndex < snippetsPerTrack; snippetIndex++) {
+			let number = trackIndex * snippetsPerTrack + snippetIndex + 1;
+			let previous = `s${number - 1}`;
+			let snippet = { id: `s${number}`, name: `snippet ${number}` };
+			if (snippetIndex == 0) {
+				snippet.source = { stream: "input" };
+				snippet.start = trackIndex == 0
+					? { event: "boot" }
+					: { ref: { id: `s${number - snippetsPerTrack}`, prop: "end" } };
+				snippet.end = { event: "button_press" };
+			} else if (snippetIndex % 3 == 0) {
+				snippet.source = { ref: { id: previous } };
+				snippet.start = { ref: { id: previous, prop: "end" } };
+			} else {
+				snippet.source = { stream: "input" };
+				snippet.start = { ref: { id: previous, prop: "end" } };
+				snippet.dur = { ref: { id: previous, prop: "dur" } };
+			}
+			snippets.push(snippet);
+		}
+		tracks.push({ id: `t${trackIndex + 1}`, name: `track ${trackIndex + 1}`, snippets: snippets });
+	}
+	return JSON.stringify({
+		program: { title: "benchmark program", tracks: tracks },
+		version: "0.1.0"
+	});
+}
+
+function measure(action, repeat = 5) {
+	let times = [];
+	for (let i = 0; i < repeat; i++) {
+		let start = performance.now();
+		action();
+		times.push(performance.now() - start);
+	}
+	return Math.min(...times);
+}
+
+window.addEventListener("DOMContentLoaded", () => {
+	let parameters = new URLSearchParams(window.location.search);
+	let trackCount = parseInt(parameters.get("tracks") ?? "10");
+	let snippetsPerTrack = parseInt(parameters.get("snippets") ?? "50");
+	let json = generateProgram(trackCount, snippetsPerTrack);
+	let options = {
+		mixerContainer: document.querySelector("#mixer"),
+		workspaceContainer: document.querySelector("#workspace"),
+		infoPanelContainer: document.querySelector("#info-panel")
+	};
+	let program;
+	let results = {};
+	results.load = measure(() => {
+		program = Program.fromJSON(json, options);
+	}, 1);
+	results["full update"] = measure(() => program.updateAll());
+	// moving the first snippet of the first track moves everything after it
+	let first = program.tracks[0].snippets[0];
+	results["edit (many dependents)"] = measure(() => {
+		first.changeStart({ event: "boot" });
+		program.updateChanged();
+	});
+	let last = program.tracks[trackCount - 1].snippets[snippetsPerTrack - 1];
+	results["edit (no dependents)"] = measure(() => {
+		last.changeName("renamed");
+		program.updateChanged();
+	});
+	let workspace = program.workspaceContainer;
+	results["scroll"] = measure(() => {
+		workspace.scrollLeft = (workspace.scrollLeft + workspace.clientWidth) % program.workspaceWidth;
+		program.renderVisibleSnippets();
+	}, 20);
+	document.querySelector("#results").innerText =
+		`${trackCount * snippetsPerTrack} snippets, ` +
+		`${program.renderedSnippets.size} rendered - ` +
+		Object.entries(results).map(([name, time]) => `${name}: ${time.toFixed(1)}ms`).join(", ");
+	console.log(results);
+});
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+
+# Compares the time it takes to load a large .laszlo file using strictyaml,
+# the fast loader and the on-disk cache. Run from the repository root with:
+#
+#	PYTHONPATH=src python3 benchmarks/load.py
+
+from laszlo.compiler import loader
+import strictyaml
+import tempfile
+import time
+import os
+import argparse
+
+
+def generate_song(track_count, snippets_per_track):
+	tracks = []
+	for track_index in range(track_count):
+		snippets = []
+		for snippet_index in range(snippets_per_track):
+			number = track_index * snippets_per_track + snippet_index + 1
+			if snippet_index == 0:
+				snippet = {
+					'id': f's{number}',
+					'name': f'snippet {number}',
+					'source': 'input',
+					'start': 'boot' if track_index == 0 else f'$s{number - snippets_per_track}.end',
+					'end': 'button_press'
+				}
+			elif snippet_index % 2:
+				snippet = {
+					'id': f's{number}',
+					'source': f'$s{number - 1}',
+					'start': f'$s{number - 1}.end'
+				}
+			else:
+				snippet = {
+					'id': f's{number}',
+					'name': f'snippet {number}',
+					'source': 'input',
+					'start': f'$s{number - 1}.end',
+					'dur': f'$s{number - 2}.dur'
+				}
+			snippets.append(snippet)
+		tracks.append({'id': f't{track_index + 1}', 'name': f'track {track_index + 1}', 'snippets': snippets})
+	# the title needs quoting and escaping when it is dumped
+	return {'program': {'title': 'benchmark song: 🎸 "riff"\x85', 'tracks': tracks}, 'version': '0.1.0'}
+
+
+def measure(function, repeat):
+	times = []
+	for _ in range(repeat):
+		start = time.perf_counter()
+		function()
+		times.append(time.perf_counter() - start)
+	return min(times)
+
+
+def main():
+	parser = argparse.ArgumentParser()
+	parser.add_argument('-n', '--snippets', default=10000, type=int)
+	parser.add_argument('-r', '--repeat', default=3, type=int)
+	args = parser.parse_args()
+	
+	generated = generate_song(100, args.snippets // 100)
+	song = loader.dump(generated)
+	schema = loader._strictyaml_schema(loader.SCHEMA)
+	# both loaders have to read back exactly what was dumped
+	assert loader.load(song) == generated
+	assert strictyaml.load(song, schema).data == generated
+	with tempfile.TemporaryDirectory() as temp_dir:
+		os.environ['XDG_CACHE_HOME'] = temp_dir
+		fname = os.path.join(temp_dir, 'song.laszlo')
+		with open(fname, mode='w', encoding='utf-8') as file:
+			file.write(song)
+		loader.load_file(fname)  # populate the cache
+		data = loader.load(song)
+		results = [
+			('load (strictyaml)', lambda: strictyaml.load(song, schema)),
+			('load (fast)', lambda: loader.load(song)),
+			('load (cached)', lambda: loader.load_file(fname)),
+			('dump (strictyaml)', lambda: strictyaml.as_document(data, schema).as_yaml()),
+			('dump (fast)', lambda: loader.dump(data))
+		]
+		print(f'{args.snippets} snippets, {len(song) / 1e6:.1f} MB')
+		for name, function in results:
+			print(f'{name:>17}: {measure(function, args.repeat):8.3f}s')
+
+
+if __name__ == '__main__':
+	main()
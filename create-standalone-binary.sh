@@ -13,12 +13,13 @@ generate_gui_init () (
 	init_script=$(</dev/stdin)
 	declare -a assets
 	
-	# maybe read this from `MANIFEST.in` instead?
-	# cat MANIFEST.in | rev | cut -d/ -f1 | rev
-	assets=( "editor.html" "main.js" )
+	# The original `__init__.py`, whose `asset_dir` gets overridden below
+	echo "$init_script"
+	
 	# shellcheck disable=2207
-	assets+=( $(<<< "$init_script" sed -n "s/^.*assets = \['\(.*\)'\]$/\1/p" | sed "s/', '/ /g") )
-	echo "assets = {"
+	assets=( $(<<< "$init_script" sed -n "s/^assets = \['\(.*\)'\]$/\1/p" | sed "s/', '/ /g") )
+	echo "
+asset_contents = {"
 	for asset in "${assets[@]}"; do
 		content=$(python3 -c "file = open('$asset', mode='rb'); print(file.read()); file.close()")
 		echo -ne "\t'$asset': "
@@ -30,16 +31,21 @@ generate_gui_init () (
 	done
 	echo "}"
 	
+	# The bundled assets are extracted once into a directory shared by all
+	# editor windows
 	echo "
-def create_asset(asset, dir):
-	fpath = os.path.join(dir, asset)
-	with open(fpath, mode='wb') as file:
-		file.write(assets[asset])
-	return fpath
-"
-	
-	# shellcheck disable=2001
-	sed 's/copy(script_dir(\(.*\)), \(.*\))$/create_asset(\1, \2)/' <<< "$init_script"
+_asset_dir = None
+
+def asset_dir():
+	global _asset_dir
+	if _asset_dir is None:
+		import tempfile, shutil, atexit
+		_asset_dir = tempfile.mkdtemp(prefix='laszlo.')
+		atexit.register(shutil.rmtree, _asset_dir, True)
+		for asset, content in asset_contents.items():
+			with open(os.path.join(_asset_dir, asset), mode='wb') as file:
+				file.write(content)
+	return _asset_dir"
 )
 
 main () (
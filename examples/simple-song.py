@@ -9,19 +9,19 @@ t1 = program.add_track('rhythm guitar')
 s1 = t1.add_snippet(
 	source = Input(),
 	start = events.Boot(),
-	end = events.ButtonPress()
+	end = events.ButtonPress(id='s1.end')
 )
 
 s2 = t1.add_snippet(
 	source = Input(),
 	start = s1.end,
-	end = events.ButtonPress()
+	end = events.ButtonPress(id='s2.end')
 )
 
 s3 = t1.add_snippet(
 	source = Input(),
 	start = s2.end,
-	end = events.ButtonPress()
+	end = events.ButtonPress(id='s3.end')
 )
 
 s4 = t1.add_snippet(
@@ -37,7 +37,7 @@ s5 = t1.add_snippet(
 s6 = t1.add_snippet(
 	source = Input(),
 	start = s5.end,
-	end = events.ButtonPress()
+	end = events.ButtonPress(id='s6.end')
 )
 
 s12 = t1.add_snippet(
@@ -1,53 +1,276 @@
-#!/usr/bin/env python3
-
-import strictyaml as yaml
+from . import loader
 import json
 import ast
-import sys, argparse
+import operator
+import hashlib
+from collections import OrderedDict
+from types import MappingProxyType
+
+
+_conversions = {
+	'python': {
+		'input': 'Input()',
+		'boot': 'events.Boot()',
+		'button_press': 'events.ButtonPress()'
+	},
+	'json': {
+		'input': {'stream': 'input'},
+		'boot': {'event': 'boot'},
+		'button_press': {'event': 'button_press'}
+	}
+}
+
+# The inverse of the JSON conversions above. Dicts are not hashable, so each
+# JSON value is keyed by its one and only item instead.
+_reverse_conversions = {
+	'json': {
+		next(iter(val.items())): key
+		for key, val in _conversions['json'].items()
+	}
+}
+
+# Serialized programs, keyed by (content hash, format). Programs are parsed
+# anew for every save/run/export in the GUI, so this cache is shared between
+# all Program instances.
+_output_cache = OrderedDict()
+_output_cache_size = 32
 
 
 class Program:
-	def __init__(self, attrs, tracks):
-		self.attrs = attrs
+	'''
+	A parsed Laszlo program. Programs, tracks and snippets are never modified
+	by conversions; edits have to go through the `add_*`, `remove_*`,
+	`move_*` and `set_*` methods, which keep the indexes and the output cache
+	consistent.
+	'''
+	def __init__(self, attrs, tracks, version = '0.1.0'):
+		self.attrs = MappingProxyType(dict(attrs))
 		self.tracks = tracks
+		self.version = version
+		self._digest = None
+		self._reindex()
+	
+	def _reindex(self):
+		self._tracks_by_id = {}
+		self._snippets_by_id = {}
+		self._tracks_by_snippet_id = {}
+		# maps snippet ids to {prop: {(referrer id, attr), ...}}, where prop is
+		# e.g. 'end' for `$s1.end`, or None for a plain `$s1`
+		self._referrers = {}
+		for track in self.tracks:
+			self._index_track(track)
+	
+	def _index_track(self, track):
+		self._tracks_by_id[track.attrs['id']] = track
+		for snippet in track.snippets:
+			self._index_snippet(snippet, track)
+	
+	def _index_snippet(self, snippet, track):
+		id = snippet.attrs['id']
+		self._snippets_by_id[id] = snippet
+		self._tracks_by_snippet_id[id] = track
+		for attr, ref_id, prop in snippet.references():
+			referrers = self._referrers.setdefault(ref_id, {})
+			referrers.setdefault(prop, set()).add((id, attr))
+	
+	def _unindex_snippet(self, snippet):
+		id = snippet.attrs['id']
+		del self._snippets_by_id[id]
+		del self._tracks_by_snippet_id[id]
+		for attr, ref_id, prop in snippet.references():
+			self._referrers[ref_id][prop].discard((id, attr))
 	
 	@classmethod
-	def fromDict(cls, input):
-		version = input['version']
-		program_attrs = input['program']
+	def fromDict(cls, input, origin = None):
 		tracks = []
-		for track_attrs in program_attrs.pop('tracks'):
-			snippets = []
-			for snippet_attrs in track_attrs.pop('snippets'):
-				snippets.append(Snippet(snippet_attrs))
-			tracks.append(Track(track_attrs, snippets))
-		program = cls(program_attrs, tracks)
-		program.version = version
-		return program
+		for track_attrs in input['program']['tracks']:
+			snippets = [
+				Snippet.fromDict(snippet_attrs, origin)
+				for snippet_attrs in track_attrs['snippets']
+			]
+			tracks.append(Track(_without(track_attrs, 'snippets'), snippets))
+		program_attrs = _without(input['program'], 'tracks')
+		return cls(program_attrs, tracks, input['version'])
 	
 	@classmethod
 	def fromYAML(cls, input):
-		parsed_input = yaml.load(input).data
+		parsed_input = loader.load(input)
+		return cls.fromDict(parsed_input)
+	
+	@classmethod
+	def fromFile(cls, fname, cache = True):
+		parsed_input = loader.load_file(fname, cache=cache)
 		return cls.fromDict(parsed_input)
 	
 	@classmethod
 	def fromJSON(cls, input):
 		parsed_input = json.loads(input)
-		instance = cls.fromDict(parsed_input)
-		for track in instance.tracks:
-			for snippet in track.snippets:
-				snippet.convert_attrs_reverse('json')
-		return instance
+		return cls.fromDict(parsed_input, origin='json')
 	
 	def get_snippet_by_id(self, id):
-		for track in self.tracks:
-			for snippet in track.snippets:
-				if snippet.attrs['id'] == id:
-					return snippet
+		try:
+			return self._snippets_by_id[id]
+		except KeyError:
+			raise IndexError(f'no snippet with id {id!r} exists') from None
+	
+	def get_track_by_id(self, id):
+		try:
+			return self._tracks_by_id[id]
+		except KeyError:
+			raise IndexError(f'no track with id {id!r} exists') from None
+	
+	def get_track_by_snippet_id(self, id):
+		try:
+			return self._tracks_by_snippet_id[id]
+		except KeyError:
+			raise IndexError(f'no snippet with id {id!r} exists') from None
+	
+	def get_referrers(self, id, prop = ...):
+		'''
+		Return a set of (snippet id, attribute) pairs of all snippets
+		referencing the snippet with the given id. If `prop` is given, only
+		references to that property are considered, e.g. 'end' for `$s1.end`
+		or None for a plain `$s1`.
+		'''
+		referrers = self._referrers.get(id, {})
+		if prop is ...:
+			return set().union(*referrers.values())
 		else:
-			raise IndexError(f'no snippet with id {id!r} exists')
+			return set(referrers.get(prop, ()))
+	
+	def get_dependents(self, id):
+		'''
+		Return the ids of all snippets that reference the snippet with the
+		given id.
+		'''
+		return {referrer for referrer, attr in self.get_referrers(id)}
+	
+	def get_dependencies(self, id):
+		'''
+		Return the ids of all snippets that the snippet with the given id
+		references.
+		'''
+		snippet = self.get_snippet_by_id(id)
+		return {ref_id for attr, ref_id, prop in snippet.references()}
+	
+	def add_track(self, attrs, index = None):
+		if attrs['id'] in self._tracks_by_id:
+			raise ValueError(f'a track with id {attrs["id"]!r} already exists')
+		track = Track(attrs, [])
+		self.tracks.insert(len(self.tracks) if index is None else index, track)
+		self._index_track(track)
+		self._digest = None
+		return track
+	
+	def remove_track(self, id):
+		track = self.get_track_by_id(id)
+		for snippet in list(track.snippets):
+			self.remove_snippet(snippet.attrs['id'])
+		self.tracks.remove(track)
+		del self._tracks_by_id[id]
+		self._digest = None
+	
+	def set_track_attr(self, id, attr, val):
+		if attr in ('id', 'snippets'):
+			raise ValueError(f'track attribute {attr!r} cannot be changed')
+		track = self.get_track_by_id(id)
+		track.attrs = MappingProxyType({**track.attrs, attr: val})
+		self._digest = None
+	
+	def add_snippet(self, track_id, attrs, index = None):
+		if attrs['id'] in self._snippets_by_id:
+			raise ValueError(f'a snippet with id {attrs["id"]!r} already exists')
+		track = self.get_track_by_id(track_id)
+		snippet = Snippet(attrs)
+		track.snippets.insert(len(track.snippets) if index is None else index, snippet)
+		self._index_snippet(snippet, track)
+		self._digest = None
+		return snippet
+	
+	def remove_snippet(self, id):
+		snippet = self.get_snippet_by_id(id)
+		self.get_track_by_snippet_id(id).snippets.remove(snippet)
+		self._unindex_snippet(snippet)
+		self._digest = None
+	
+	def move_snippet(self, id, track_id, index = None):
+		snippet = self.get_snippet_by_id(id)
+		new_track = self.get_track_by_id(track_id)
+		self.get_track_by_snippet_id(id).snippets.remove(snippet)
+		new_track.snippets.insert(len(new_track.snippets) if index is None else index, snippet)
+		self._tracks_by_snippet_id[id] = new_track
+		self._digest = None
+	
+	def set_snippet_attr(self, id, attr, val):
+		'''
+		Change a snippet attribute. If `val` is None, the attribute is removed.
+		'''
+		if attr == 'id':
+			raise ValueError('snippet ids cannot be changed')
+		snippet = self.get_snippet_by_id(id)
+		track = self.get_track_by_snippet_id(id)
+		self._unindex_snippet(snippet)
+		if val is None:
+			snippet.attrs = MappingProxyType(_without(snippet.attrs, attr))
+		else:
+			snippet.attrs = MappingProxyType({**snippet.attrs, attr: val})
+		self._index_snippet(snippet, track)
+		self._digest = None
+	
+	def apply_changes(self, changes, origin = 'json'):
+		'''
+		Apply a list of edits, as recorded by the editor. Each change is a dict
+		with an 'op' key naming one of the editing methods above, plus that
+		method's arguments. Attribute values are converted from `origin`.
+		'''
+		def convert(attrs):
+			return Snippet.convert_attrs_reverse(attrs, origin)
+		for change in changes:
+			op = change['op']
+			if op == 'add_track':
+				self.add_track(change['attrs'])
+			elif op == 'remove_track':
+				self.remove_track(change['id'])
+			elif op == 'set_track_attr':
+				self.set_track_attr(change['id'], change['attr'], change['value'])
+			elif op == 'add_snippet':
+				self.add_snippet(change['track'], convert(change['attrs']))
+			elif op == 'remove_snippet':
+				self.remove_snippet(change['id'])
+			elif op == 'move_snippet':
+				self.move_snippet(change['id'], change['track'])
+			elif op == 'set_snippet_attr':
+				attr, val = change['attr'], change['value']
+				if val is not None:
+					val = convert({attr: val})[attr]
+				self.set_snippet_attr(change['id'], attr, val)
+			else:
+				raise ValueError(f'unknown change {op!r}')
+	
+	@property
+	def digest(self):
+		'''
+		A hash of the program's contents, used as the key for cached output.
+		'''
+		if self._digest is None:
+			content = json.dumps(self.as_dict()).encode()
+			self._digest = hashlib.sha1(content).hexdigest()
+		return self._digest
+	
+	def _cached(self, format, convert):
+		key = (self.digest, format)
+		if key in _output_cache:
+			_output_cache.move_to_end(key)
+		else:
+			_output_cache[key] = convert()
+			if len(_output_cache) > _output_cache_size:
+				_output_cache.popitem(last=False)
+		return _output_cache[key]
 	
 	def as_python(self):
+		return self._cached('python', self._as_python)
+	
+	def _as_python(self):
 		title = 'program'
 		header = (
 			'#!/usr/bin/env python3\n\n'
@@ -58,28 +281,45 @@ class Program:
 		footer = f'\n\n{title}.start()'
 		return header + content + footer
 	
-	def as_dict(self):
+	def as_engine(self):
+		'''
+		Build a `laszlo.engine.Program` directly from this program, without
+		generating and re-parsing Python source code.
+		'''
+		from .. import engine
+		program = engine.Program()
+		namespace = {}
+		for track in self.tracks:
+			track.as_engine(program, namespace)
+		return program
+	
+	def analyze(self, *args, **kwargs):
+		'''
+		Estimate the program's timing and resource usage, see
+		`laszlo.compiler.analysis.analyze`.
+		'''
+		from .analysis import analyze
+		return analyze(self, *args, **kwargs)
+	
+	def as_dict(self, target = None):
 		return {
 			'program': {
 				**self.attrs,
-				'tracks': [track.as_dict() for track in self.tracks]
+				'tracks': [track.as_dict(target) for track in self.tracks]
 			},
 			'version': self.version
 		}
 	
 	def as_yaml(self):
-		return yaml.as_document(self.as_dict()).as_yaml()
+		return self._cached('yaml', lambda: loader.dump(self.as_dict()))
 	
 	def as_json(self):
-		for track in self.tracks:
-			for snippet in track.snippets:
-				snippet.convert_attrs('json')
-		return json.dumps(self.as_dict())
+		return self._cached('json', lambda: json.dumps(self.as_dict('json')))
 
 
 class Track:
 	def __init__(self, attrs, snippets):
-		self.attrs = attrs
+		self.attrs = MappingProxyType(dict(attrs))
 		self.snippets = snippets
 	
 	def as_python(self, program_name):
@@ -89,13 +329,26 @@ class Track:
 		content = '\n\n'.join(snippet.as_python(id) for snippet in self.snippets)
 		return header + content
 	
-	def as_dict(self):
-		return {**self.attrs, 'snippets': [snippet.as_dict() for snippet in self.snippets]}
+	def as_engine(self, program, namespace):
+		track = program.add_track(self.attrs['name'])
+		for snippet in self.snippets:
+			namespace[snippet.attrs['id']] = snippet.as_engine(track, namespace)
+		return track
+	
+	def as_dict(self, target = None):
+		return {**self.attrs, 'snippets': [snippet.as_dict(target) for snippet in self.snippets]}
 
 
 class Snippet:
 	def __init__(self, attrs):
-		self.attrs = attrs
+		self.attrs = MappingProxyType(dict(attrs))
+	
+	@classmethod
+	def fromDict(cls, attrs, origin = None):
+		if origin is None:
+			return cls(attrs)
+		else:
+			return cls(cls.convert_attrs_reverse(attrs, origin))
 	
 	def parse_expr(self, expr):
 		if type(expr) == ast.BinOp:
@@ -127,7 +380,36 @@ class Snippet:
 		elif type(expr) == ast.Constant:
 			return expr.value
 	
-	def generate_expr(self, attr):
+	def evaluate_expr(self, expr, namespace):
+		if type(expr) == dict:
+			if 'ref' in expr:
+				id = expr['ref']['id']
+				if id not in namespace:
+					raise IndexError(
+						f'snippet {self.attrs["id"]!r} references snippet {id!r}, '
+						'which has not been defined before it'
+					)
+				if 'prop' in expr['ref']:
+					return getattr(namespace[id], expr['ref']['prop'])
+				else:
+					return namespace[id]
+			else:
+				operators = {
+					'add': operator.add,
+					'sub': operator.sub,
+					'mul': operator.mul,
+					'div': operator.truediv
+				}
+				(op, (left, right)), = expr.items()
+				return operators[op](
+					self.evaluate_expr(left, namespace),
+					self.evaluate_expr(right, namespace)
+				)
+		else:
+			return expr
+	
+	@staticmethod
+	def generate_expr(attr):
 		expr = ''
 		if 'ref' in attr:
 			expr += '$' + attr['ref']['id']
@@ -137,55 +419,81 @@ class Snippet:
 			raise NotImplementedError
 		return expr
 	
+	def references(self):
+		'''
+		Yield an (attribute, snippet id, property) triple for every reference
+		to another snippet, e.g. ('start', 's1', 'end') for `start: $s1.end`.
+		'''
+		def walk(expr):
+			if type(expr) == dict:
+				if 'ref' in expr:
+					yield expr['ref']['id'], expr['ref'].get('prop')
+				else:
+					for val in expr.values():
+						yield from walk(val)
+			elif type(expr) == list:
+				for val in expr:
+					yield from walk(val)
+		for attr, val in self.attrs.items():
+			if type(val) == str:
+				if '$' not in val:
+					continue
+				val = self.parse_expr(ast.parse(val.replace('$', ''), mode='eval').body)
+			for id, prop in walk(val):
+				yield attr, id, prop
+	
 	def convert_attrs(self, target):
-		if target == 'python':
-			conversions = {
-				'input': 'Input()',
-				'boot': 'events.Boot()',
-				'button_press': 'events.ButtonPress()'
-			}
-		elif target == 'json':
-			conversions = {
-				'input': {'stream': 'input'},
-				'boot': {'event': 'boot'},
-				'button_press': {'event': 'button_press'}
-			}
+		'''
+		Return a new dict of this snippet's attributes converted to `target`.
+		'''
+		conversions = _conversions[target]
+		converted = {}
 		for attr, val in self.attrs.items():
 			if not '$' in val:
-				self.attrs[attr] = conversions.get(val, val)
+				converted[attr] = conversions.get(val, val)
+				if type(converted[attr]) == dict:
+					converted[attr] = dict(converted[attr])
 			else:
 				pythonic = val.replace('$', '')
 				if target == 'python':
-					self.attrs[attr] = pythonic
+					converted[attr] = pythonic
 				elif target == 'json':
 					expr = ast.parse(pythonic, mode='eval').body
-					self.attrs[attr] = self.parse_expr(expr)
-	
-	def convert_attrs_reverse(self, origin):
-		if origin == 'json':
-			conversions = {
-				'input': {'stream': 'input'},
-				'boot': {'event': 'boot'},
-				'button_press': {'event': 'button_press'}
-			}
-		elif origin == 'python':
+					converted[attr] = self.parse_expr(expr)
+		return converted
+	
+	@classmethod
+	def convert_attrs_reverse(cls, attrs, origin):
+		'''
+		Return a new dict of the given attributes converted from `origin`.
+		'''
+		if origin == 'python':
 			raise NotImplementedError
-		for attr, val in self.attrs.items():
+		conversions = _reverse_conversions[origin]
+		converted = {}
+		for attr, val in attrs.items():
 			if type(val) == dict:
-				if val in conversions.values():
-					# this is essentially the inverse of the `dict.get` function
-					# - we can't simply invert the conversions dict because that
-					# would mean using dicts as keys and they are not hashable
-					self.attrs[attr] = list(conversions.keys())[list(conversions.values()).index(val)]
+				item = next(iter(val.items())) if len(val) == 1 else None
+				if item is not None and type(item[1]) == str and item in conversions:
+					converted[attr] = conversions[item]
 				else:
-					if origin == 'json':
-						self.attrs[attr] = self.generate_expr(val)
-					elif origin == 'python':
-						raise NotImplementedError
+					converted[attr] = cls.generate_expr(val)
+			else:
+				converted[attr] = val
+		return converted
+	
+	def press_id(self, attr):
+		'''
+		The id of the button press that the attribute `attr` stands for, which
+		event sources can trigger it by (e.g. 's1.end').
+		'''
+		return f"{self.attrs['id']}.{attr}"
 	
 	def as_python(self, track_name):
-		self.convert_attrs('python')
-		attrs = self.attrs.copy()  # we will be removing items, so we need a deep copy
+		attrs = self.convert_attrs('python')
+		for attr, val in self.attrs.items():
+			if val == 'button_press':
+				attrs[attr] = f'events.ButtonPress(id={self.press_id(attr)!r})'
 		id = attrs.pop('id')
 		if 'name' in attrs:
 			attrs['name'] = repr(attrs['name'])
@@ -194,8 +502,41 @@ class Snippet:
 		output = f'{id} = {track_name}.add_snippet(\n\t{args}\n)'
 		return output
 	
-	def as_dict(self):
-		return self.attrs
+	def as_engine(self, track, namespace):
+		from .. import engine
+		conversions = {
+			'input': engine.Input,
+			'boot': engine.events.Boot,
+			'button_press': engine.events.ButtonPress
+		}
+		kwargs = {}
+		for attr, val in self.attrs.items():
+			if attr in ('id', 'name'):
+				continue  # TODO: allow name attributes for snippets in engine
+			elif '$' in val:
+				expr = ast.parse(val.replace('$', ''), mode='eval').body
+				kwargs[attr] = self.evaluate_expr(self.parse_expr(expr), namespace)
+			elif val == 'button_press':
+				# the id lets event sources trigger this press directly
+				kwargs[attr] = conversions[val](id=self.press_id(attr))
+			elif val in conversions:
+				kwargs[attr] = conversions[val]()
+			else:
+				try:
+					kwargs[attr] = ast.literal_eval(val)
+				except (ValueError, SyntaxError):
+					kwargs[attr] = val
+		return track.add_snippet(**kwargs)
+	
+	def as_dict(self, target = None):
+		if target is None:
+			return dict(self.attrs)
+		else:
+			return self.convert_attrs(target)
+
+
+def _without(attrs, key):
+	return {attr: val for attr, val in attrs.items() if attr != key}
 
 
 def laszlo2python(input):
@@ -208,19 +549,7 @@ def laszlo2json(input):
 	return program.as_json()
 
 
-if __name__ == '__main__':
-	parser = argparse.ArgumentParser()
-	parser.add_argument('input', nargs='?', default=sys.stdin, type=argparse.FileType('r'))
-	parser.add_argument('-o', '--output', default=sys.stdout, type=argparse.FileType('w'))
-	parser.add_argument('-t', '--to', default='python', metavar='format')
-	args = parser.parse_args()
-	if len(sys.argv) == 1 and sys.stdin.isatty():
-		# if the user has provided no arguments and isn't piping into the
-		# program, just show them the help page and exit
-		parser.print_help()
-		sys.exit()
-	if args.to == 'python':
-		convert = laszlo2python
-	elif args.to == 'json':
-		convert = laszlo2json
-	print(convert(args.input.read()), file=args.output)
+def laszlo2engine(input):
+	program = Program.fromYAML(input)
+	return program.as_engine()
+
@@ -0,0 +1,84 @@
+from . import Program, laszlo2python, laszlo2json
+from .batch import FORMATS, compile_many
+from .analysis import format_analysis
+import os.path, glob
+import sys, argparse
+
+def main():
+	parser = argparse.ArgumentParser()
+	parser.add_argument('input', nargs='*',
+		help='input file(s). Passing several files, directories or glob patterns '
+			'(or the -d option) compiles all of them in parallel')
+	parser.add_argument('-o', '--output', default=sys.stdout, type=argparse.FileType('w'))
+	parser.add_argument('-t', '--to', default='python', metavar='format', choices=FORMATS)
+	analysis_options = parser.add_argument_group('analysis')
+	analysis_options.add_argument('-a', '--analyze', action='store_true',
+		help='instead of compiling, estimate timing and resource usage')
+	analysis_options.add_argument('-D', '--duration', action='append', default=[], metavar='id=seconds',
+		help='assumed duration of a snippet starting or ending with a button press')
+	analysis_options.add_argument('--default-duration', type=float, default=8.0, metavar='seconds',
+		help='duration assumed for button press snippets without -D (default: 8)')
+	analysis_options.add_argument('--memory-limit', type=float, metavar='MiB',
+		help='exit with an error if the table memory exceeds this')
+	analysis_options.add_argument('--dsp-limit', type=float, metavar='load',
+		help='exit with an error if the estimated peak DSP load exceeds this')
+	batch_options = parser.add_argument_group('batch mode')
+	batch_options.add_argument('-d', '--output-dir', metavar='dir',
+		help='write output files to this directory instead of next to their inputs')
+	batch_options.add_argument('-j', '--jobs', type=int, metavar='n',
+		help='number of worker processes (default: number of CPUs)')
+	batch_options.add_argument('-f', '--force', action='store_true',
+		help='recompile files even if they have not changed')
+	args = parser.parse_args()
+	if len(sys.argv) == 1 and sys.stdin.isatty():
+		# if the user has provided no arguments and isn't piping into the
+		# program, just show them the help page and exit
+		parser.print_help()
+		sys.exit()
+	is_batch = (
+		args.output_dir is not None
+		or len(args.input) > 1
+		or any(os.path.isdir(input) or glob.has_magic(input) for input in args.input)
+	)
+	if args.analyze:
+		durations = {}
+		for duration in args.duration:
+			id, _, seconds = duration.partition('=')
+			durations[id] = float(seconds)
+		if args.input and args.input[0] != '-':
+			program = Program.fromFile(args.input[0])
+		else:
+			program = Program.fromYAML(sys.stdin.read())
+		analysis = program.analyze(durations, args.default_duration)
+		print(format_analysis(analysis), file=args.output)
+		exceeded = (
+			(args.memory_limit is not None and analysis['table_memory'] > args.memory_limit * 2**20)
+			or (args.dsp_limit is not None and analysis['peak_dsp_load'] > args.dsp_limit)
+		)
+		sys.exit(1 if exceeded else 0)
+	if is_batch:
+		results = compile_many(args.input, args.output_dir, args.to, args.jobs, args.force)
+		counts = {
+			status: sum(result.status == status for result in results)
+			for status in ('ok', 'skipped', 'error')
+		}
+		total = sum(result.duration for result in results)
+		print(
+			f'{counts["ok"]} compiled, {counts["skipped"]} skipped, '
+			f'{counts["error"]} failed ({total:.3f}s of compilation time)',
+			file=sys.stderr
+		)
+		sys.exit(1 if counts['error'] else 0)
+	if args.to == 'python':
+		convert = laszlo2python
+	elif args.to == 'json':
+		convert = laszlo2json
+	if args.input and args.input[0] != '-':
+		with open(args.input[0]) as file:
+			input = file.read()
+	else:
+		input = sys.stdin.read()
+	print(convert(input), file=args.output)
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,270 @@
+'''
+Static timing and resource analysis of Laszlo programs.
+
+Button presses can't be known in advance, so the analysis works with assumed
+(or measured) durations: for a snippet ending with `button_press`, its duration
+is the time between its start and the press, and for a snippet starting with
+`button_press`, it is the time between the previous press (or boot) and that
+press. From there, the start and end of every snippet follows from the
+program's references, and with them the audio engine objects that are running
+and the tables that are allocated at any time.
+'''
+
+import math
+
+
+__all__ = ['DSP_COSTS', 'analyze', 'format_analysis']
+
+
+# Rough relative CPU cost of the engine's audio objects, with a live input
+# (including its monitoring output) as the unit
+DSP_COSTS = {
+	'input': 1.0,
+	'recorder': 0.25,
+	'player': 0.5
+}
+
+# The length in seconds of the table that snippets ending with a button press
+# record into, see `laszlo.engine.snippets._snippet_init_length`
+_template_length = 60
+
+_channels = 2
+
+
+def _is_ref(val):
+	return '$' in val
+
+
+class _Timing:
+	def __init__(self, program, durations, default_duration):
+		self.program = program
+		self.durations = durations
+		self.default_duration = default_duration
+		self.times = {}
+		self.resolving = set()
+		# The engine assigns button presses to ButtonPress events in the order
+		# the events were created, i.e. in order of definition
+		self.presses = [
+			(snippet.attrs['id'], attr)
+			for track in program.tracks
+			for snippet in track.snippets
+			for attr, val in snippet.attrs.items()
+			if val == 'button_press'
+		]
+	
+	def assumed_duration(self, id):
+		return float(self.durations.get(id, self.default_duration))
+	
+	def evaluate(self, snippet, expr):
+		if type(expr) == dict:
+			if 'ref' in expr:
+				return self.time(expr['ref']['id'], expr['ref'].get('prop'))
+			(op, (left, right)), = expr.items()
+			left, right = self.evaluate(snippet, left), self.evaluate(snippet, right)
+			if op == 'add':
+				return left + right
+			elif op == 'sub':
+				return left - right
+			elif op == 'mul':
+				return left * right
+			elif op == 'div':
+				return left / right
+		else:
+			return float(expr)
+	
+	def attr_time(self, snippet, attr):
+		val = snippet.attrs[attr]
+		if val == 'boot':
+			return 0.0
+		elif val == 'button_press':
+			id = snippet.attrs['id']
+			if attr == 'end':
+				return self.time(id, 'start') + self.assumed_duration(id)
+			index = self.presses.index((id, attr))
+			previous = self.time(*self.presses[index - 1]) if index > 0 else 0.0
+			return previous + self.assumed_duration(id)
+		elif _is_ref(val):
+			return self.evaluate(snippet, snippet.convert_attrs('json')[attr])
+		else:
+			return float(val)
+	
+	def time(self, id, prop):
+		key = (id, prop)
+		if key in self.times:
+			return self.times[key]
+		if key in self.resolving:
+			raise ValueError(f'the {prop} of snippet {id!r} depends on itself')
+		self.resolving.add(key)
+		snippet = self.program.get_snippet_by_id(id)
+		attrs = snippet.attrs
+		if prop == 'start':
+			value = self.attr_time(snippet, 'start')
+		elif prop == 'dur':
+			if 'dur' in attrs:
+				value = self.attr_time(snippet, 'dur')
+			elif 'end' in attrs:
+				value = self.time(id, 'end') - self.time(id, 'start')
+			elif _is_ref(attrs['source']):
+				value = self.time(attrs['source'].lstrip('$'), 'dur')
+			else:
+				raise ValueError(f'snippet {id!r} has neither an end nor a duration')
+		elif prop == 'end':
+			if 'end' in attrs:
+				value = self.attr_time(snippet, 'end')
+			else:
+				# The `end` that other snippets can reference is always
+				# start + dur, even for repeated clones (their playback is
+				# stopped by a separate event)
+				value = self.time(id, 'start') + self.time(id, 'dur')
+		else:
+			raise ValueError(f'snippets have no property {prop!r}')
+		self.resolving.discard(key)
+		self.times[key] = value
+		return value
+
+
+def _peak(intervals):
+	'''
+	The maximum total weight of simultaneously active (start, end, weight)
+	intervals.
+	'''
+	changes = []
+	for start, end, weight in intervals:
+		if end > start:
+			changes.append((start, weight))
+			changes.append((end, -weight))
+	# at the same point in time, process ends before starts
+	changes.sort(key=lambda change: (change[0], change[1]))
+	current = peak = 0
+	for _, weight in changes:
+		current += weight
+		peak = max(peak, current)
+	return peak
+
+
+def analyze(program, durations = None, default_duration = 8.0, sampling_rate = 44100, sample_size = 4, costs = DSP_COSTS):
+	'''
+	Compute every snippet's start and end, plus the peak number of players
+	and recorders, the table memory (in bytes) and the estimated peak DSP
+	load (see DSP_COSTS), both per track and in total.
+	
+	durations: A dict mapping snippet ids to the assumed duration in seconds
+		of snippets starting or ending with a button press (optional)
+	default_duration: The duration assumed for button press snippets
+		missing from `durations`
+	sampling_rate: The audio server's sampling rate
+	sample_size: The size of a sample in bytes. 4 for pyo, 8 for pyo64
+	'''
+	timing = _Timing(program, durations or {}, default_duration)
+	recording = {
+		ref_id
+		for track in program.tracks
+		for snippet in track.snippets
+		for attr, ref_id, prop in snippet.references()
+		if attr == 'source'
+	}
+	bytes_per_second = sampling_rate * _channels * sample_size
+	snippets = {}
+	tracks = {}
+	all_intervals = {'player': [], 'recorder': [], 'dsp': []}
+	for track in program.tracks:
+		intervals = {'player': [], 'recorder': [], 'dsp': []}
+		table_memory = 0
+		for snippet in track.snippets:
+			id = snippet.attrs['id']
+			start = timing.time(id, 'start')
+			dur = timing.time(id, 'dur')
+			end = timing.time(id, 'end')
+			monitoring = snippet.attrs.get('monitoring', 'True') != 'False'
+			if not _is_ref(snippet.attrs['source']):
+				kind = 'live'
+				active_until = end
+				# Live inputs are created when the program starts, and only
+				# stopped at the end of the snippet if it is being monitored
+				intervals['dsp'].append((0, end if monitoring else math.inf, costs['input']))
+				if id in recording:
+					intervals['recorder'].append((start, end, 1))
+					intervals['dsp'].append((start, end, costs['recorder']))
+					if 'end' in snippet.attrs:
+						table_memory += (_template_length + dur) * bytes_per_second
+					else:
+						table_memory += dur * bytes_per_second
+			else:
+				kind = 'clone'
+				repeat = int(snippet.attrs.get('repeat', '1'))
+				if repeat == -1:
+					active_until = math.inf
+				else:
+					active_until = start + repeat * dur
+				intervals['player'].append((start, active_until, 1))
+				intervals['dsp'].append((start, active_until, costs['player']))
+			snippets[id] = {
+				'track': track.attrs['id'],
+				'kind': kind,
+				'recording': id in recording,
+				'start': start,
+				'end': end,
+				'dur': dur,
+				'active_until': active_until
+			}
+		tracks[track.attrs['id']] = {
+			'name': track.attrs['name'],
+			'peak_players': _peak(intervals['player']),
+			'peak_recorders': _peak(intervals['recorder']),
+			'table_memory': int(table_memory),
+			'peak_dsp_load': _peak(intervals['dsp'])
+		}
+		for key in all_intervals:
+			all_intervals[key].extend(intervals[key])
+	ends = [snippet['active_until'] for snippet in snippets.values()]
+	warnings = []
+	press_times = [timing.time(*press) for press in timing.presses]
+	for index in range(1, len(timing.presses)):
+		if press_times[index] < press_times[index - 1]:
+			(id, attr), (previous_id, previous_attr) = timing.presses[index], timing.presses[index - 1]
+			warnings.append(
+				f'the button press at the {attr} of snippet {id!r} is assumed to '
+				f'happen before the one at the {previous_attr} of snippet '
+				f'{previous_id!r}, but presses are assigned in order of definition'
+			)
+	return {
+		'snippets': snippets,
+		'tracks': tracks,
+		'length': max((end for end in ends if end != math.inf), default=0.0),
+		'loops_forever': math.inf in ends,
+		'peak_players': _peak(all_intervals['player']),
+		'peak_recorders': _peak(all_intervals['recorder']),
+		'table_memory': sum(track['table_memory'] for track in tracks.values()),
+		'peak_dsp_load': _peak(all_intervals['dsp']),
+		'warnings': warnings
+	}
+
+
+def format_analysis(analysis):
+	def time(seconds):
+		return 'forever' if seconds == math.inf else f'{seconds:.2f}s'
+	def memory(size):
+		return f'{size / 2**20:.1f} MiB'
+	lines = ['snippet  track  kind   start      end        dur        plays until']
+	for id, snippet in analysis['snippets'].items():
+		kind = 'rec' if snippet['recording'] else snippet['kind']
+		lines.append(
+			f'{id:<8} {snippet["track"]:<6} {kind:<6} {time(snippet["start"]):<10} '
+			f'{time(snippet["end"]):<10} {time(snippet["dur"]):<10} {time(snippet["active_until"])}'
+		)
+	lines.append('')
+	lines.append('track  players  recorders  table memory  DSP load  name')
+	for id, track in analysis['tracks'].items():
+		lines.append(
+			f'{id:<6} {track["peak_players"]:<8} {track["peak_recorders"]:<10} '
+			f'{memory(track["table_memory"]):<13} {track["peak_dsp_load"]:<9.2f} {track["name"]}'
+		)
+	lines.append(
+		f'{"total":<6} {analysis["peak_players"]:<8} {analysis["peak_recorders"]:<10} '
+		f'{memory(analysis["table_memory"]):<13} {analysis["peak_dsp_load"]:.2f}'
+	)
+	lines.append('')
+	length = time(analysis['length'])
+	lines.append(f'length: {length}' + (', then loops forever' if analysis['loops_forever'] else ''))
+	lines.extend(f'warning: {warning}' for warning in analysis['warnings'])
+	return '\n'.join(lines)
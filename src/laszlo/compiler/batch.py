@@ -0,0 +1,202 @@
+'''
+Compilation of many .laszlo files at once, spread over a pool of processes.
+
+Files whose contents haven't changed since they were last compiled by the
+same version of the compiler (and whose output is still untouched) are
+skipped. For this purpose a manifest of content hashes is kept in the same
+cache directory as the parsed programs.
+'''
+
+from . import Program, loader
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import hashlib
+import json
+import os.path
+import glob
+import time
+import traceback
+
+
+__all__ = ['FORMATS', 'find_inputs', 'compile_many']
+
+
+# maps output formats to file extensions
+FORMATS = {
+	'python': '.py',
+	'json': '.json'
+}
+
+
+class Result:
+	def __init__(self, input, output, status, duration = 0, error = None):
+		self.input = input
+		self.output = output
+		self.status = status
+		self.duration = duration
+		self.error = error
+	
+	def __str__(self):
+		line = f'{self.status:>7} {self.duration:7.3f}s  {self.input} -> {self.output}'
+		if self.error:
+			line += '\n' + '\n'.join('\t' + l for l in self.error.splitlines())
+		return line
+
+
+def find_inputs(paths):
+	'''
+	Expand directories (recursively) and glob patterns in `paths` into a list
+	of (input file, path relative to the output directory) pairs.
+	'''
+	inputs = []
+	for path in paths:
+		if os.path.isdir(path):
+			pattern = os.path.join(glob.escape(path), '**', '*.laszlo')
+			inputs.extend(
+				(fname, os.path.relpath(fname, path))
+				for fname in sorted(glob.glob(pattern, recursive=True))
+			)
+		elif glob.has_magic(path):
+			inputs.extend(
+				(fname, os.path.basename(fname))
+				for fname in sorted(glob.glob(path, recursive=True))
+				if os.path.isfile(fname)
+			)
+		else:
+			inputs.append((path, os.path.basename(path)))
+	return inputs
+
+
+def _output_path(input, relpath, output_dir, to):
+	base = os.path.splitext(relpath if output_dir else input)[0]
+	return os.path.join(output_dir or '', base + FORMATS[to])
+
+
+def _hash(content):
+	return hashlib.sha1(content).hexdigest()
+
+
+def _compiler_hash():
+	# Hashing the compiler's sources, rather than relying on a version number
+	# that has to be bumped, means that any change to it recompiles everything
+	digest = hashlib.sha1()
+	directory = os.path.dirname(os.path.abspath(__file__))
+	for fname in sorted(glob.glob(os.path.join(glob.escape(directory), '*.py'))):
+		with open(fname, mode='rb') as file:
+			digest.update(file.read())
+	return digest.hexdigest()
+
+
+def _manifest_path():
+	return os.path.join(os.path.dirname(loader._cache_dir()), 'batch.json')
+
+
+def _load_manifest():
+	try:
+		with open(_manifest_path()) as file:
+			return json.load(file)
+	except (OSError, ValueError):
+		return {}
+
+
+def _save_manifest(manifest):
+	try:
+		os.makedirs(os.path.dirname(_manifest_path()), exist_ok=True)
+		temp_file = f'{_manifest_path()}.{os.getpid()}'
+		with open(temp_file, mode='w') as file:
+			json.dump(manifest, file)
+		os.replace(temp_file, _manifest_path())
+	except OSError:
+		pass
+
+
+def _is_up_to_date(entry, input_hash, compiler, output):
+	if (
+		entry is None or entry.get('input') != input_hash
+		or entry.get('compiler') != compiler
+	):
+		return False
+	try:
+		with open(output, mode='rb') as file:
+			return _hash(file.read()) == entry['output']
+	except OSError:
+		return False
+
+
+def _compile_file(input, content, output, to):
+	# This runs in a worker process, so it must not raise: any error is
+	# reported back to the parent instead
+	start = time.perf_counter()
+	try:
+		program = Program.fromYAML(content.decode())
+		# written as bytes, so that the file contents match the hash below
+		# regardless of the platform's newline translation
+		converted = (getattr(program, f'as_{to}')() + '\n').encode()
+		if os.path.dirname(output):
+			os.makedirs(os.path.dirname(output), exist_ok=True)
+		with open(output, mode='wb') as file:
+			file.write(converted)
+	except Exception as exception:
+		error = ''.join(traceback.format_exception_only(type(exception), exception)).strip()
+		return Result(input, output, 'error', time.perf_counter() - start, error), None
+	output_hash = _hash(converted)
+	return Result(input, output, 'ok', time.perf_counter() - start), output_hash
+
+
+def compile_many(paths, output_dir = None, to = 'python', jobs = None, force = False, report = print):
+	'''
+	Compile all .laszlo files in `paths`, which may contain files,
+	directories and glob patterns. Output files are written to `output_dir`
+	(keeping the directory structure of directory inputs), or next to their
+	input if `output_dir` is None. Unchanged files are skipped unless `force`
+	is True. Errors are reported rather than raised, so one broken file
+	doesn't stop the batch. `report` is called with the result of each file
+	as soon as it is available. Returns the list of all results.
+	'''
+	manifest = _load_manifest()
+	compiler = f'{_compiler_hash()}:{to}'
+	results = []
+	inputs = find_inputs(paths)
+	# inputs with the same output path would overwrite each other, e.g.
+	# a/song.laszlo and b/song.laszlo both compiled into one directory
+	outputs = {}
+	for input, relpath in inputs:
+		key = os.path.abspath(_output_path(input, relpath, output_dir, to))
+		outputs.setdefault(key, []).append(input)
+	with ProcessPoolExecutor(max_workers=jobs) as executor:
+		futures = {}
+		for input, relpath in inputs:
+			output = _output_path(input, relpath, output_dir, to)
+			key = os.path.abspath(output)
+			if len(outputs[key]) > 1:
+				others = ', '.join(other for other in outputs[key] if other != input)
+				result = Result(input, output, 'error', error=f'output path is also used by {others}')
+				results.append(result)
+				report(result)
+				continue
+			try:
+				with open(input, mode='rb') as file:
+					content = file.read()
+			except OSError as error:
+				result = Result(input, output, 'error', error=str(error))
+				results.append(result)
+				report(result)
+				continue
+			input_hash = _hash(content)
+			if not force and _is_up_to_date(manifest.get(key), input_hash, compiler, output):
+				result = Result(input, output, 'skipped')
+				results.append(result)
+				report(result)
+				continue
+			future = executor.submit(_compile_file, input, content, output, to)
+			futures[future] = (key, input_hash)
+		for future in as_completed(futures):
+			result, output_hash = future.result()
+			key, input_hash = futures[future]
+			if output_hash is not None:
+				manifest[key] = {'input': input_hash, 'output': output_hash, 'compiler': compiler}
+			else:
+				manifest.pop(key, None)
+			results.append(result)
+			report(result)
+	_save_manifest(manifest)
+	return results
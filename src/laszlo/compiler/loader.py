@@ -0,0 +1,291 @@
+'''
+Schema-validated loading and dumping of .laszlo files.
+
+Loading uses PyYAML's libyaml bindings if they are available, since
+`strictyaml` is written in pure Python and gets very slow for large programs.
+Both loaders read every scalar as a string and validate the result against the
+same schema. The fast loader also rejects the YAML features that strictyaml
+rejects (flow style, anchors and aliases, tags and duplicate keys), so both
+accept the same files and produce the same results. Parsed programs can
+additionally be cached on disk, keyed by a hash of the file contents.
+'''
+
+import strictyaml
+import hashlib
+import json
+import os.path
+import re
+
+try:
+	import yaml as pyyaml
+	_fast_loader = getattr(pyyaml, 'CBaseLoader', pyyaml.BaseLoader)
+except ModuleNotFoundError:
+	_fast_loader = None
+
+# Bump this whenever the loaded data changes for the same file contents, so
+# that outdated cache entries are no longer used
+_loader_version = 2
+
+# The maximum number of cached programs
+_cache_size = 256
+
+
+__all__ = [
+	'SCHEMA',
+	'ValidationError',
+	'validate',
+	'load',
+	'load_file',
+	'dump'
+]
+
+
+# The structure of a .laszlo file. Keys ending in '?' are optional, lists
+# describe sequences of their only element, and `str` stands for any scalar
+# (all scalars are read as strings).
+SCHEMA = {
+	'program': {
+		'title?': str,
+		'tracks': [{
+			'id': str,
+			'name': str,
+			'snippets': [{
+				'id': str,
+				'name?': str,
+				'source': str,
+				'start': str,
+				'end?': str,
+				'dur?': str,
+				'repeat?': str,
+				'monitoring?': str
+			}]
+		}]
+	},
+	'version': str
+}
+
+
+class ValidationError(ValueError):
+	pass
+
+
+def validate(data, schema = SCHEMA, path = ''):
+	'''
+	Make sure that `data` matches `schema`, raising a ValidationError if not.
+	Empty values where a sequence is expected are replaced by empty lists.
+	'''
+	if schema is str:
+		if type(data) != str:
+			raise ValidationError(f'{path or "document"}: expected a scalar')
+	elif type(schema) == list:
+		if type(data) != list:
+			raise ValidationError(f'{path or "document"}: expected a sequence')
+		for index, item in enumerate(data):
+			validate(item, schema[0], f'{path}[{index}]')
+	elif type(schema) == dict:
+		if type(data) != dict:
+			raise ValidationError(f'{path or "document"}: expected a mapping')
+		keys = {key.rstrip('?'): key for key in schema}
+		for key in data:
+			if key not in keys:
+				raise ValidationError(f'{path or "document"}: unexpected key {key!r}')
+		for key, schema_key in keys.items():
+			if type(schema[schema_key]) == list and data.get(key) == '':
+				# strictyaml writes empty lists as empty values, which
+				# PyYAML reads as empty strings
+				data[key] = []
+			if key in data:
+				validate(data[key], schema[schema_key], f'{path}.{key}' if path else key)
+			elif not schema_key.endswith('?'):
+				raise ValidationError(f'{path or "document"}: missing key {key!r}')
+
+
+def _strictyaml_schema(schema):
+	if schema is str:
+		return strictyaml.Str()
+	elif type(schema) == list:
+		return strictyaml.Seq(_strictyaml_schema(schema[0])) | strictyaml.EmptyList()
+	elif type(schema) == dict:
+		return strictyaml.Map({
+			(strictyaml.Optional(key[:-1]) if key.endswith('?') else key):
+				_strictyaml_schema(val)
+			for key, val in schema.items()
+		})
+
+
+def _load_fast(input):
+	# Build the data from the parser events rather than with PyYAML's
+	# constructor, so that the features strictyaml disallows can be rejected
+	def error(event, message):
+		raise ValidationError(f'line {event.start_mark.line + 1}: {message}')
+	stack = []
+	data = None
+	for event in pyyaml.parse(input, Loader=_fast_loader):
+		if isinstance(event, pyyaml.AliasEvent) or getattr(event, 'anchor', None) is not None:
+			error(event, 'anchors and aliases are not allowed')
+		elif isinstance(event, (pyyaml.ScalarEvent, pyyaml.CollectionStartEvent)):
+			if event.tag is not None:
+				error(event, 'tags are not allowed')
+			if isinstance(event, pyyaml.CollectionStartEvent) and event.flow_style:
+				error(event, 'flow style is not allowed')
+			if isinstance(event, pyyaml.ScalarEvent):
+				value = event.value
+			elif isinstance(event, pyyaml.MappingStartEvent):
+				value = {}
+			else:
+				value = []
+			if not stack:
+				data = value
+			elif type(stack[-1][0]) == list:
+				stack[-1][0].append(value)
+			elif stack[-1][1] is None:
+				# a mapping key
+				if type(value) != str:
+					error(event, 'keys must be scalars')
+				elif value in stack[-1][0]:
+					error(event, f'duplicate key {value!r}')
+				stack[-1][1] = value
+			else:
+				stack[-1][0][stack[-1][1]] = value
+				stack[-1][1] = None
+			if type(value) != str:
+				stack.append([value, None])
+		elif isinstance(event, pyyaml.CollectionEndEvent):
+			stack.pop()
+	return data
+
+
+def load(input):
+	'''
+	Parse and validate the contents of a .laszlo file.
+	'''
+	if _fast_loader is not None:
+		try:
+			data = _load_fast(input)
+		except pyyaml.YAMLError as error:
+			raise ValidationError(str(error))
+		validate(data)
+		return data
+	else:
+		return strictyaml.load(input, _strictyaml_schema(SCHEMA)).data
+
+
+def _cache_dir():
+	base = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+	return os.path.join(base, 'laszlo', 'programs')
+
+
+def load_file(fname, cache = True):
+	'''
+	Like `load`, but read the program from the file `fname`. If `cache` is
+	True, the parsed program is stored on disk and reused for as long as the
+	file contents don't change.
+	'''
+	with open(fname, mode='rb') as file:
+		content = file.read()
+	if not cache:
+		return load(content.decode())
+	# the schema is part of the key, so that changing it invalidates the cache
+	key = hashlib.sha1(f'{_loader_version}:{SCHEMA!r}:'.encode() + content).hexdigest()
+	cache_file = os.path.join(_cache_dir(), key + '.json')
+	try:
+		with open(cache_file) as file:
+			data = json.load(file)
+		validate(data)
+		# keep recently used entries from being pruned
+		os.utime(cache_file)
+		return data
+	except (OSError, ValueError):
+		pass  # this includes ValidationErrors
+	data = load(content.decode())
+	try:
+		os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+		# write to a temporary file first so that concurrent readers never see
+		# a partially written cache entry
+		temp_file = f'{cache_file}.{os.getpid()}'
+		with open(temp_file, mode='w') as file:
+			json.dump(data, file)
+		os.replace(temp_file, cache_file)
+		_prune_cache()
+	except OSError:
+		pass  # caching is an optimization, so failing to cache is not an error
+	return data
+
+
+def _prune_cache():
+	# remove the least recently used entries beyond the cache size
+	entries = []
+	with os.scandir(_cache_dir()) as directory:
+		for entry in directory:
+			if entry.name.endswith('.json'):
+				try:
+					entries.append((entry.stat().st_mtime, entry.path))
+				except OSError:
+					pass
+	entries.sort()
+	for _, path in entries[:-_cache_size]:
+		try:
+			os.remove(path)
+		except OSError:
+			pass
+
+
+_indicators = set('-?:,[]{}#&*!|>\'"%@`')
+_plain_scalar = re.compile(r'^[^\n\t]*$')
+# characters that YAML either doesn't allow unescaped or reads as line breaks
+# or byte order marks
+_non_printable = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f\x7f-\x9f\u2028\u2029\ud800-\udfff\ufeff\ufffe\uffff]')
+
+
+def _scalar(val):
+	if (
+		val and val == val.strip() and val[0] not in _indicators
+		and _plain_scalar.match(val) and not _non_printable.search(val)
+		and ': ' not in val and ' #' not in val
+		and not val.endswith(':')
+	):
+		return val
+	else:
+		# JSON strings are valid double-quoted YAML scalars, as long as
+		# characters outside the BMP aren't escaped as surrogate pairs, which
+		# YAML rejects
+		quoted = json.dumps(val, ensure_ascii=False)
+		return _non_printable.sub(lambda match: f'\\u{ord(match.group()):04x}', quoted)
+
+
+def _dump(data, indent):
+	lines = []
+	for key, val in data.items():
+		if type(val) == dict:
+			lines.append(f'{indent}{key}:')
+			lines.extend(_dump(val, indent + '  '))
+			lines.append('')
+		elif type(val) == list:
+			if not val:
+				# this is how strictyaml represents empty lists
+				lines.append(f'{indent}{key}:')
+				continue
+			lines.append(f'{indent}{key}:')
+			for item in val:
+				item_lines = _dump(item, indent + '  ')
+				# replace the indentation of the first line with the dash
+				item_lines[0] = f'{indent}- {item_lines[0][len(indent) + 2:]}'
+				lines.extend(item_lines)
+				if lines[-1] != '':
+					lines.append('')
+			lines.pop()
+		else:
+			lines.append(f'{indent}{key}: {_scalar(val)}')
+	return lines
+
+
+def dump(data):
+	'''
+	Serialize a program dict to the .laszlo format, laid out the same way as
+	hand-written .laszlo files.
+	'''
+	validate(data)
+	lines = _dump(data, '')
+	while lines and lines[-1] == '':
+		lines.pop()
+	return '\n'.join(lines) + '\n'
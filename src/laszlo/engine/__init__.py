@@ -1,8 +1,10 @@
 from .main import *
+from . import sources
 
 __all__ = [
 	'Program',
 	'Input',
 	'events',
-	'effects'
+	'effects',
+	'sources'
 ]
@@ -0,0 +1,25 @@
+from ..compiler import Program
+from . import sources
+import argparse
+
+def main():
+	parser = argparse.ArgumentParser(description='Run a Laszlo file with the audio engine.')
+	# Reading the program from stdin is not supported, since stdin is needed
+	# for the button presses when not running on a Raspberry Pi
+	parser.add_argument('input', type=argparse.FileType('r'))
+	parser.add_argument('--osc', metavar='PORT', type=int, nargs='?', const=sources.DEFAULT_OSC_PORT,
+		help=f'also accept OSC messages on this UDP port (default: {sources.DEFAULT_OSC_PORT})')
+	parser.add_argument('--midi', metavar='PORT', nargs='?', const='',
+		help='also accept MIDI input from this port (default: the system default)')
+	args = parser.parse_args()
+	args.input.close()
+	program = Program.fromFile(args.input.name).as_engine()
+	event_sources = sources.default_sources()
+	if args.osc is not None:
+		event_sources.append(sources.OSCSource(port=args.osc))
+	if args.midi is not None:
+		event_sources.append(sources.MIDISource(args.midi or None))
+	program.start(event_sources)
+
+if __name__ == '__main__':
+	main()
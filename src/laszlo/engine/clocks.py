@@ -0,0 +1,92 @@
+'''
+Clocks that timed events (`laszlo.engine.events.Time`) are scheduled with.
+
+The RealClock uses wall-clock time and timer threads. The OfflineClock
+simulates time instead: it drives an audio server running in manual mode
+(`pyo.Server(audio='manual')`) block by block, and calls scheduled callbacks
+in between blocks, so that hours of a performance can be run in minutes.
+'''
+
+import heapq
+import itertools
+import threading
+import time
+
+
+__all__ = ['RealClock', 'OfflineClock']
+
+
+class RealClock:
+	def __init__(self):
+		self.timers = set()
+	
+	def time(self):
+		return time.time()
+	
+	def call_later(self, delay, callback):
+		def run():
+			self.timers.discard(timer)
+			callback()
+		timer = threading.Timer(delay, run)
+		self.timers.add(timer)
+		timer.start()
+	
+	def pending(self):
+		'''
+		The number of callbacks that are scheduled but haven't run yet.
+		'''
+		return len(self.timers)
+	
+	def cancel_all(self):
+		for timer in list(self.timers):
+			timer.cancel()
+		self.timers.clear()
+
+
+class OfflineClock:
+	'''
+	Simulated time, advanced by `advance`.
+	
+	server: A booted and started pyo server in manual mode
+	'''
+	def __init__(self, server):
+		self.server = server
+		self.block_size = server.getBufferSize()
+		self.sampling_rate = server.getSamplingRate()
+		self.samples = 0
+		self.scheduled = []
+		self._counter = itertools.count()
+	
+	def time(self):
+		return self.samples / self.sampling_rate
+	
+	def call_later(self, delay, callback):
+		# the counter keeps callbacks that are due at the same time in order
+		heapq.heappush(self.scheduled, (self.time() + delay, next(self._counter), callback))
+	
+	def pending(self):
+		'''
+		The number of callbacks that are scheduled but haven't run yet, i.e.
+		the number of timer threads a RealClock would be running.
+		'''
+		return len(self.scheduled)
+	
+	def cancel_all(self):
+		self.scheduled.clear()
+	
+	def _run_due(self):
+		while self.scheduled and self.scheduled[0][0] <= self.time():
+			_, _, callback = heapq.heappop(self.scheduled)
+			callback()
+	
+	def advance(self, seconds):
+		'''
+		Process `seconds` worth of audio, calling scheduled callbacks at the
+		start of the first block at or after the time they are due.
+		'''
+		end = self.samples + round(seconds * self.sampling_rate)
+		while self.samples < end:
+			self._run_due()
+			self.server.process()
+			self.samples += self.block_size
+		self._run_due()
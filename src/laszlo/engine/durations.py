@@ -0,0 +1,148 @@
+'''
+Durations that are only known while the program is running.
+
+The duration of a snippet that ends with a button press is unknown until the
+press happens, and so is any arithmetic on it (e.g. `s2.dur * 2 + s3.dur`).
+Such durations are represented as a graph of expressions. Each node computes
+its value once, as soon as all of its inputs are known, caches it, and then
+notifies the nodes depending on it.
+'''
+
+import operator
+
+
+__all__ = [
+	'DurationExpression',
+	'SnippetDuration',
+	'BinaryDuration',
+	'UndeterminedDuration'
+]
+
+
+class DurationExpression:
+	def __init__(self, *inputs):
+		self.inputs = inputs
+		self.dependents = []
+		self.callbacks = []
+		self._value = None
+		for input in inputs:
+			if isinstance(input, DurationExpression):
+				input.dependents.append(self)
+	
+	@property
+	def resolved(self):
+		return self._value is not None
+	
+	def evaluate(self):
+		'''
+		Compute the value from the inputs, which are all known at this point.
+		'''
+		raise NotImplementedError
+	
+	def is_computable(self):
+		return all(
+			input.resolved or input.is_computable()
+			for input in self.inputs
+			if isinstance(input, DurationExpression)
+		)
+	
+	def compute(self):
+		'''
+		The duration in seconds. Raises an exception if it isn't known yet.
+		'''
+		if self._value is None:
+			if not self.is_computable():
+				raise Exception('oh no, duration is not known yet')
+			self._resolve(self.evaluate())
+		return self._value
+	
+	def update(self):
+		'''
+		Resolve the expression if all of its inputs have become known.
+		'''
+		if self._value is None and self.is_computable():
+			self._resolve(self.evaluate())
+	
+	def _resolve(self, value):
+		self._value = value
+		for dependent in self.dependents:
+			dependent.update()
+		for callback in self.callbacks:
+			callback(value)
+	
+	def when_resolved(self, callback):
+		'''
+		Call `callback` with the value as soon as it is known.
+		'''
+		if self._value is not None:
+			callback(self._value)
+		else:
+			self.callbacks.append(callback)
+	
+	def _binary(self, op, left, right):
+		if not isinstance(left, (DurationExpression, int, float)) or not isinstance(right, (DurationExpression, int, float)):
+			# this leaves e.g. `duration + event` to `Event.__radd__`
+			return NotImplemented
+		return BinaryDuration(op, left, right)
+	
+	def __add__(self, other):
+		return self._binary(operator.add, self, other)
+	
+	def __radd__(self, other):
+		return self._binary(operator.add, other, self)
+	
+	def __sub__(self, other):
+		return self._binary(operator.sub, self, other)
+	
+	def __rsub__(self, other):
+		return self._binary(operator.sub, other, self)
+	
+	def __mul__(self, other):
+		return self._binary(operator.mul, self, other)
+	
+	def __rmul__(self, other):
+		return self._binary(operator.mul, other, self)
+	
+	def __truediv__(self, other):
+		return self._binary(operator.truediv, self, other)
+	
+	def __rtruediv__(self, other):
+		return self._binary(operator.truediv, other, self)
+
+
+class SnippetDuration(DurationExpression):
+	'''
+	The duration of a snippet, known once both its start and end happened.
+	'''
+	def __init__(self, snippet):
+		super().__init__()
+		self.snippet = snippet
+	
+	def is_computable(self):
+		return self.snippet.start.happened and self.snippet.end.happened
+	
+	def evaluate(self):
+		return self.snippet.end.time - self.snippet.start.time
+
+
+class BinaryDuration(DurationExpression):
+	'''
+	An arithmetic operation on durations and/or numbers.
+	'''
+	def __init__(self, op, left, right):
+		super().__init__(left, right)
+		self.op = op
+	
+	def evaluate(self):
+		left, right = (
+			input.compute() if isinstance(input, DurationExpression) else input
+			for input in self.inputs
+		)
+		return self.op(left, right)
+
+
+def UndeterminedDuration(snippet, factor = 1):
+	'''
+	The duration of `snippet` times `factor`, as created by earlier versions.
+	'''
+	return SnippetDuration(snippet) * factor
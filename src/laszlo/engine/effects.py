@@ -2,7 +2,13 @@ import pyo
 
 
 class Effect:
-	pass
+	# Effects with the same type and parameters are interchangeable, which lets
+	# tracks merge identical fx chains onto a shared bus
+	def __eq__(self, other):
+		return type(self) == type(other) and vars(self) == vars(other)
+	
+	def __hash__(self):
+		return hash(type(self))
 
 
 class PitchShift(Effect):
@@ -16,3 +22,68 @@ class PitchShift(Effect):
 	
 	def __call__(self, input):
 		return pyo.Harmonizer(input, transpo=self.interval)
+
+
+class Bus:
+	'''
+	A shared fx chain. Any number of signals can be routed into a bus, and a
+	single instance of each of its effects processes their sum.
+	
+	fx: A list of effects (optional)
+	send: Another bus that the processed signal should be routed into. If
+		None, it is sent to the DAC (optional)
+	name: Name of the bus (optional)
+	'''
+	def __init__(self, fx = None, send = None, name = None):
+		self.fx = fx or []
+		self.send = send
+		self.name = name
+		self.inputs = []
+		self._input = None
+	
+	def _instantiate(self):
+		# pyo objects can only be created once the server has been booted, so
+		# this happens when the first signal is routed into the bus
+		if self._input is not None:
+			return
+		self._input = pyo.Sig([0, 0])
+		self.output = self._input
+		for effect in self.fx:
+			self.output = effect(self.output)
+		if self.send is None:
+			self.output.out()
+		else:
+			self.send.connect(self.output)
+	
+	def stop(self):
+		if self._input is not None:
+			if self.send is not None:
+				self.send.disconnect(self.output)
+			self.output.stop()
+			self._input.stop()
+		self.inputs = []
+		self._input = self.output = None
+	
+	def _update_input(self):
+		if self.inputs:
+			self._input.value = pyo.Mix(self.inputs, voices=2)
+		else:
+			self._input.value = 0
+	
+	def connect(self, signal):
+		'''
+		Route `signal` into the bus.
+		'''
+		self._instantiate()
+		# pyo objects overload `==`, so they have to be compared by identity
+		if not any(input is signal for input in self.inputs):
+			self.inputs.append(signal)
+			self._update_input()
+	
+	def disconnect(self, signal):
+		'''
+		Stop routing `signal` into the bus.
+		'''
+		if self._input is not None:
+			self.inputs = [input for input in self.inputs if input is not signal]
+			self._update_input()
@@ -1,52 +1,132 @@
-from .snippets import UndeterminedDuration
-import threading, time
+from .durations import DurationExpression
+from .clocks import RealClock
+import queue, collections
 
 
 __all__ = [
 	'Event',
 	'Time',
 	'ButtonPress',
-	'Boot'
+	'Boot',
+	'bind'
 ]
 
 
 class EventHandler:
+	'''
+	Dispatches the messages of all event sources (see `laszlo.engine.sources`)
+	to the events waiting for them. Sources run in their own threads and only
+	queue messages, which are then processed one at a time by the thread
+	running the program.
+	'''
 	def __init__(self):
-		self.button_presses = []
+		self.clock = RealClock()
+		self.reset()
+	
+	def reset(self):
+		'''
+		Forget all events and cancel all pending timers, e.g. before defining
+		a new program.
+		'''
+		self.clock.cancel_all()
+		# pending button presses per button, in order of definition
+		self.button_presses = {}
+		self.events_by_id = {}
+		self.pending_presses = 0
+		self.messages = queue.SimpleQueue()
+		self.bindings = {}
+		self.boot = None
 	
 	def add_event(self, event):
+		if event.id is not None:
+			# An id that is already taken usually means that the same program
+			# is being built again, so the newest event gets the id
+			self.events_by_id[event.id] = event
 		if isinstance(event, ButtonPress):
-			self.button_presses.append(event)
+			self.button_presses.setdefault(event.button, collections.deque()).append(event)
+			self.pending_presses += 1
 		elif isinstance(event, Boot):
 			self.boot = event
 	
+	def _emit_press(self, press):
+		self.pending_presses -= 1
+		press.emit()
+	
+	def bind(self, button, callback):
+		'''
+		Call `callback` on every press of `button`, instead of assigning its
+		presses to ButtonPress events.
+		'''
+		self.bindings.setdefault(button, []).append(callback)
+	
+	def press(self, button = None):
+		'''
+		Emit the next pending press of `button`. Presses of a button that
+		isn't expecting any are ignored.
+		'''
+		if button in self.bindings:
+			for callback in self.bindings[button]:
+				callback()
+			return
+		presses = self.button_presses.get(button)
+		# presses that have already been triggered by their id are skipped
+		while presses and presses[0].happened:
+			presses.popleft()
+		if presses:
+			self._emit_press(presses.popleft())
+	
+	def trigger(self, id):
+		'''
+		Emit the pending button press with the given id.
+		'''
+		event = self.events_by_id.get(id)
+		if isinstance(event, ButtonPress) and not event.happened:
+			self._emit_press(event)
+	
+	def dispatch(self, button = None, id = None):
+		'''
+		Queue a press of `button`, or of the event with the given `id`. Unlike
+		the other methods, this is safe to call from any thread.
+		'''
+		self.messages.put((button, id))
+	
+	def process_message(self):
+		'''
+		Wait for the next queued message and emit the event it is meant for.
+		'''
+		button, id = self.messages.get()
+		if id is not None:
+			self.trigger(id)
+		else:
+			self.press(button)
+	
 	def emit_event(self, event_type):
 		if event_type == ButtonPress:
 			# TODO: raise error if not expecting press
-			press = self.button_presses.pop(0)
-			press.emit()
+			self.press()
 		elif event_type == Boot:
 			# TODO: raise error if already booted
-			if hasattr(self, 'boot'):
+			if self.boot is not None:
 				self.boot.emit()
 	
 	def is_expecting_event(self, event_type):
 		if event_type == ButtonPress:
-			return len(self.button_presses) > 0
+			return self.pending_presses > 0
 
 
 class Event:
-	def __init__(self, actions = None):
+	def __init__(self, actions = None, id = None):
 		# DO NOT think that you can refactor things by replacing the `None` in the parameter list with `[]`. It will lead to all instances of this class having their `actions` point to the same list instance, and it took me way too long to find that out
 		self.__time = None
 		self.actions = actions or []
+		self.id = id
 		_handler.add_event(self)
 	
 	def add_action(self, *actions):
 		self.actions.extend(actions)
 	
 	def emit(self):
-		self.__time = time.time()
+		self.__time = _handler.clock.time()
 		self.execute_actions()
 	
 	def execute_actions(self):
@@ -60,6 +140,10 @@ class Event:
 	def __radd__(self, other):
 		return self.__add__(other)
 	
+	@property
+	def happened(self):
+		return self.__time is not None
+	
 	@property
 	def time(self):
 		if self.__time is not None:
@@ -73,20 +157,27 @@ class Time(Event):
 		self.trigger = trigger
 		self.delay = delay
 		super().__init__()
-		if isinstance(delay, UndeterminedDuration):
+		if isinstance(delay, DurationExpression):
 			def action():
-				threading.Timer(self.delay.compute(), self.emit).start()
+				_handler.clock.call_later(self.delay.compute(), self.emit)
 		else:
 			def action():
-				threading.Timer(self.delay, self.emit).start()
+				_handler.clock.call_later(self.delay, self.emit)
 		self.trigger.add_action(action)
 
 
 class ButtonPress(Event):
 	'''
-	An event that fires each time a button/footswitch is pressed.
+	An event that fires when a button/footswitch is pressed. Presses of the
+	same button are assigned to its ButtonPress events in order of definition.
+	
+	button: The name of the button, as dispatched by the event sources. The
+		default of None stands for the main button/footswitch (optional)
+	id: An id that the event can be triggered by directly (optional)
 	'''
-	pass
+	def __init__(self, actions = None, id = None, button = None):
+		self.button = button
+		super().__init__(actions, id)
 
 
 class Boot(Event):
@@ -97,4 +188,12 @@ class Boot(Event):
 	pass
 
 
+def bind(button, callback):
+	'''
+	Call `callback` each time `button` is pressed, e.g. to control the takes
+	of a snippet: `events.bind('undo', snippet.undo_take)`
+	'''
+	_handler.bind(button, callback)
+
+
 _handler = EventHandler()
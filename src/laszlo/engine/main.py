@@ -1,5 +1,5 @@
 from .snippets import *
-from . import events, effects
+from . import events, effects, sources as event_sources
 import pyo
 
 
@@ -30,17 +30,36 @@ class Program:
 	'''
 	def __init__(self):
 		self.tracks = []
+		self.buses = []
 	
-	def add_track(self, name = None):
+	def add_track(self, name = None, fx = None, send = None):
 		'''
 		Add a track for grouping snippets.
 		
 		name: Name of the track (optional)
+		fx: A list of effects applied to the sum of all of the track's
+			snippets (optional)
+		send: A bus that the track's output should be routed into (optional)
 		'''
-		track = Track(name or 'Untitled track')
+		track = Track(name or 'Untitled track', fx, send)
 		self.tracks.append(track)
 		return track
 	
+	def add_bus(self, fx = None, send = None, name = None):
+		'''
+		Add an effect bus that tracks and snippets can be routed into via their
+		`send` argument, so that one instance of each effect processes all of
+		their signals.
+		
+		fx: A list of effects (optional)
+		send: Another bus that the output should be routed into. If None, it
+			is sent to the DAC (optional)
+		name: Name of the bus (optional)
+		'''
+		bus = effects.Bus(fx, send, name)
+		self.buses.append(bus)
+		return bus
+	
 	def _boot_server(self):
 		if not raspberry:
 			self.server = pyo.Server().boot()
@@ -49,26 +68,48 @@ class Program:
 		self.server.start()
 	
 	def _define_events(self):
+		for bus in self.buses:
+			bus._instantiate()
 		for track in self.tracks:
 			track._define_events()
 	
-	def start(self):
+	def start(self, sources = None):
 		'''
 		Start the performance. This boots the audio server and either performs
 		user-defined actions, or awaits user-defined instructions.
+		
+		sources: A list of event sources (see `laszlo.engine.sources`) that
+			trigger button presses. Default is the keyboard, or the GPIO
+			footswitch on a Raspberry Pi (optional)
 		'''
+		if sources is None:
+			sources = event_sources.default_sources()
+		handler = events._handler
 		self._boot_server()
 		self._define_events()
-		events._handler.emit_event(events.Boot)
-		while True:
-			wait()
-			events._handler.emit_event(events.ButtonPress)
-			if not events._handler.is_expecting_event(events.ButtonPress):
-				print('Program finished. Press Enter now at any time to exit.')
-				wait()
-				print('Goodbye!')
-				self.server.stop()
-				break
+		handler.emit_event(events.Boot)
+		for source in sources:
+			source.start(handler)
+		while handler.is_expecting_event(events.ButtonPress):
+			handler.process_message()
+		print('Program finished. Press any button now at any time to exit.')
+		handler.process_message()
+		print('Goodbye!')
+		for source in sources:
+			source.stop()
+		self.stop()
+		self.server.stop()
+	
+	def stop(self):
+		'''
+		Cancel all pending events and release the program's audio objects, so
+		that another program can be run on the same server afterwards.
+		'''
+		events._handler.reset()
+		for track in self.tracks:
+			track.stop()
+		for bus in self.buses:
+			bus.stop()
 
 
 class Track:
@@ -76,12 +117,21 @@ class Track:
 	A track for grouping snippets.
 	
 	name: Name of the track
+	fx: A list of effects applied to the sum of all of the track's snippets
+		(optional)
+	send: A bus that the track's output should be routed into (optional)
 	'''
-	def __init__(self, name):
+	def __init__(self, name, fx = None, send = None):
 		self.name = name
 		self.snippets = []
+		self.buses = []
+		if fx or send is not None:
+			self.bus = effects.Bus(fx, send, name)
+			self.buses.append(self.bus)
+		else:
+			self.bus = None
 	
-	def add_snippet(self, source, start, *, end = None, dur = None, repeat = None, fx = None, monitoring = True):
+	def add_snippet(self, source, start, *, end = None, dur = None, repeat = None, fx = None, monitoring = True, send = None, take_budget = None):
 		'''
 		Add a snippet.
 		
@@ -99,6 +149,11 @@ class Track:
 		fx: A list of effects (optional)
 		monitoring: Whether the snippet's sound output should be sent to the
 			DAC. Default is True (optional)
+		send: A bus that the snippet's output should be routed into instead
+			of the DAC. Default is the track's bus, if it has one (optional)
+		take_budget: How many bytes of inactive takes of a live input snippet
+			to keep in memory before moving them to disk. Default is
+			`laszlo.engine.takes.DEFAULT_BUDGET` (optional)
 		'''
 		# TODO: refactoring
 		if repeat is None:
@@ -106,7 +161,9 @@ class Track:
 			repeat = 1
 		else:
 			repeat_was_default = False
-		args = (source, start, end, dur, repeat, fx, monitoring)
+		if send is None:
+			send = self.bus
+		args = (source, start, end, dur, repeat, fx, monitoring, send)
 		if isinstance(source, Input):
 			if not repeat_was_default:
 				raise Exception('oh no, `repeat` is not an option for live input snippets')
@@ -115,16 +172,18 @@ class Track:
 			elif end is None and dur is None:
 				raise Exception('oh no, must have `end` or `dur` in args')
 			elif end is not None:
-				snippet = LiveUndeterminedLengthSnippet(*args)
-			elif isinstance(dur, UndeterminedDuration):
-				snippet = LiveDependentLengthSnippet(*args)
+				snippet = LiveUndeterminedLengthSnippet(*args, take_budget=take_budget)
+			elif isinstance(dur, DurationExpression):
+				snippet = LiveDependentLengthSnippet(*args, take_budget=take_budget)
 			elif isinstance(dur, (float, int)):
 				# snippet = LiveFixedLengthSnippet(*args)
 				raise NotImplementedError
 			else:
 				raise Exception('oh no, this shouldnt be able to happen')
 		elif isinstance(source, (BaseSnippet, str)):
-			if end is not None and dur is not None:
+			if take_budget is not None:
+				raise Exception('oh no, `take_budget` is only an option for live input snippets')
+			elif end is not None and dur is not None:
 				raise Exception('oh no, cant have `end` and `dur` in args')
 			elif (end is not None or dur is not None) and repeat not in (-1, 0, 1):
 				raise Exception('oh no, cant have `end` or `dur` and a specific `repeat`')
@@ -135,7 +194,7 @@ class Track:
 				else:
 					# snippet = PrerecordedUndeterminedLengthSnippet(*args)
 					raise NotImplementedError
-			elif dur is None or isinstance(dur, UndeterminedDuration):
+			elif dur is None or isinstance(dur, DurationExpression):
 				if isinstance(source, BaseSnippet):
 					snippet = ClonedDependentLengthSnippet(*args)
 				else:
@@ -155,6 +214,33 @@ class Track:
 		self.snippets.append(snippet)
 		return snippet
 	
+	def _merge_fx_chains(self):
+		# Snippets with identical fx chains can share one instance of each
+		# effect, unless their processed signal is being recorded
+		groups = {}
+		for snippet in self.snippets:
+			if (
+				snippet.fx and snippet.monitoring
+				and not (isinstance(snippet, LiveSnippet) and snippet.recording)
+			):
+				groups.setdefault((tuple(snippet.fx), snippet.send), []).append(snippet)
+		for (fx, send), snippets in groups.items():
+			if len(snippets) > 1:
+				bus = effects.Bus(list(fx), send, self.name)
+				self.buses.append(bus)
+				for snippet in snippets:
+					snippet.fx = []
+					snippet.send = bus
+	
+	def stop(self):
+		for snippet in self.snippets:
+			snippet.stop()
+		for bus in self.buses:
+			bus.stop()
+	
 	def _define_events(self):
+		self._merge_fx_chains()
+		for bus in self.buses:
+			bus._instantiate()
 		for snippet in self.snippets:
 			snippet._define_events()
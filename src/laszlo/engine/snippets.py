@@ -1,5 +1,6 @@
+from .durations import *
+from .takes import TakeStore
 import pyo
-import time
 
 try:
 	from gpiozero import *
@@ -8,50 +9,18 @@ try:
 	button = Button(25)
 	on_air = led.on
 	off_air = led.off
-	button_has_been_released = True
-	def button_release():
-		global button_has_been_released
-		button_has_been_released = True
-	button.when_released = button_release
-	def wait():
-		global button_has_been_released
-		button.wait_for_press()
-		if button_has_been_released:
-			button_has_been_released = False
-		else:
-			# This sleep helps us avoid exceeding the maximum recursion depth.
-			# With the default recursion depth of 1000, the user would have to
-			# press and hold the button for 0.1*1000=100 seconds in order to
-			# exceed the maximum recursion depth.
-			time.sleep(0.1)
-			wait()
+	# presses of the button are handled by `laszlo.engine.sources.GPIOSource`
 except ModuleNotFoundError:
 	raspberry = False
 	on_air = lambda: print('Now recording')
 	off_air = lambda: print('Stopped recording')
-	wait = input
 
 _snippet_init_length = 60
 #_min_rec_length = 1
 
 
-class UndeterminedDuration:
-	def __init__(self, snippet, factor = 1):
-		self.snippet = snippet
-		self.factor = factor
-	
-	def compute(self):
-		return self.snippet.dur * self.factor
-	
-	def __mul__(self, other):
-		return UndeterminedDuration(self.snippet, other)
-	
-	def __rmul__(self, other):
-		return self.__mul__(other)
-
-
 class BaseSnippet:
-	def __init__(self, source, start, end, dur, repeat, fx, monitoring):
+	def __init__(self, source, start, end, dur, repeat, fx, monitoring, send):
 		self.source = source
 		self.start = start
 		self._end = end
@@ -59,6 +28,7 @@ class BaseSnippet:
 		self.repeat = repeat
 		self.fx = fx or []
 		self.monitoring = monitoring
+		self.send = send
 		self.recording = False
 	
 	def signal_recording_start(self):
@@ -79,9 +49,22 @@ class BaseSnippet:
 	
 	def start_recording(self):
 		self.recorder.play()
+	
+	def stop(self):
+		# Dropping the references lets pyo free the objects, which otherwise
+		# keep being processed for as long as the server runs
+		for attr in ('player', 'reader', 'recorder', '_raw_source', 'table', 'template_table', '_swap_trigger'):
+			obj = vars(self).pop(attr, None)
+			if isinstance(obj, pyo.PyoObject):
+				obj.stop()
 
 
 class LiveSnippet(BaseSnippet):
+	def __init__(self, *args, take_budget = None):
+		super().__init__(*args)
+		self.takes = TakeStore(take_budget)
+		self._take_recording = None
+	
 	def _instantiate_raw_source(self):
 		self._raw_source = self.source.get_raw()
 		self.apply_fx()
@@ -91,17 +74,87 @@ class LiveSnippet(BaseSnippet):
 			self._raw_source = effect(self._raw_source)
 	
 	def start_monitoring(self):
-		self._raw_source.out()
+		if self.send is None:
+			self._raw_source.out()
+		else:
+			# `stop_monitoring` stops the source, so restart it
+			self._raw_source.play()
+			self.send.connect(self._raw_source)
 	
 	def stop_monitoring(self):
+		if self.send is not None:
+			self.send.disconnect(self._raw_source)
 		# TODO: find a way to stop just the outputting, not the processing
 		self._raw_source.stop()
+	
+	def record_take(self, overdub = False):
+		'''
+		Record a new take of the snippet, starting now and lasting as long as
+		the active take. Clones of the snippet switch to the new take at
+		their next loop boundary.
+		
+		overdub: Whether to record on top of the active take rather than
+			replacing it (optional)
+		'''
+		if not self.takes:
+			raise Exception('oh no, the snippet has to be recorded before it can be retaken')
+		elif self._take_recording is not None:
+			return
+		self.takes.start_worker()
+		active = self.takes.table
+		table = pyo.NewTable(active.getDur(), chnls=2)
+		# the source has been stopped if it was monitored before
+		self._raw_source.play()
+		if self.monitoring:
+			self.start_monitoring()
+		signal = self._raw_source
+		if overdub:
+			signal = signal + pyo.TableRead(active, freq=active.getRate()).play()
+		recorder = pyo.TableRec(signal, table).play()
+		self.signal_recording_start()
+		finished = []
+		def finish():
+			# This runs on the audio thread, so everything else is left to the
+			# take store's worker thread
+			if finished:
+				return  # the trigger fires once per channel
+			finished.append(True)
+			self.takes.add_later(table, end_take)
+		def end_take():
+			for obj in self._take_recording:
+				obj.stop()
+			self._take_recording = None
+			if self.monitoring:
+				self.stop_monitoring()
+			off_air()
+		self._take_recording = (signal, recorder, pyo.TrigFunc(recorder['trig'], finish))
+	
+	def overdub_take(self):
+		self.record_take(overdub=True)
+	
+	def undo_take(self):
+		return self.takes.undo()
+	
+	def redo_take(self):
+		return self.takes.redo()
+	
+	def stop(self):
+		# this waits for takes that have finished recording to be added
+		self.takes.close()
+		if self._take_recording is not None:
+			for obj in self._take_recording:
+				obj.stop()
+			self._take_recording = None
+		super().stop()
 
 
 class ClonedSnippet(BaseSnippet):
 	def __init__(self, source, *args):
-		super().__init__(source, *args)
-		self.dur = self.dur or source.dur
+		# Not super().__init__, since in subclasses that would also run e.g.
+		# DependentLengthSnippet.__init__, which would create an end event
+		# before the duration is known (and thus a timer that never fires)
+		BaseSnippet.__init__(self, source, *args)
+		self.dur = self._dur or source.dur
 		source.recording = True
 	
 	def apply_fx(self):
@@ -109,20 +162,48 @@ class ClonedSnippet(BaseSnippet):
 			self.player = effect(self.player)
 	
 	def start_playback(self):
-		self.player = pyo.TableRead(self.table, freq=self.table.getRate()).play()
+		self.reader = self.player = pyo.TableRead(self.table, freq=self.table.getRate()).play()
 		self.apply_fx()
 	
 	def start_playback_loop(self):
-		self.player = pyo.TableRead(self.table, freq=self.table.getRate(), loop=1).play()
+		self.reader = self.player = pyo.TableRead(self.table, freq=self.table.getRate(), loop=1).play()
 		self.apply_fx()
 	
+	def swap_table(self, table):
+		'''
+		Play `table` instead of the current one. If the snippet is being
+		played, this happens at its next loop boundary.
+		'''
+		reader = getattr(self, 'reader', None)
+		if reader is None or not reader.isPlaying():
+			self.table = table
+			return
+		def swap():
+			# the table is played as is, not copied. The old one is only
+			# released once the reader has let go of it, since it may have been
+			# evicted from the take store already
+			reader.setTable(table)
+			reader.setFreq(table.getRate())
+			self.table = table
+			self._swap_trigger.stop()
+		if getattr(self, '_swap_trigger', None) is not None:
+			self._swap_trigger.stop()
+		self._swap_trigger = pyo.TrigFunc(reader['trig'], swap)
+	
 	def stop_playback(self):
+		if self.send is not None:
+			self.send.disconnect(self.player)
 		self.player.stop()
 	
 	def start_monitoring(self):
-		self.player.out()
+		if self.send is None:
+			self.player.out()
+		else:
+			self.send.connect(self.player)
 	
 	def stop_monitoring(self):
+		if self.send is not None:
+			self.send.disconnect(self.player)
 		# TODO: find a way to stop just the outputting, not the processing
 		self.player.stop()
 
@@ -131,19 +212,24 @@ class UndeterminedLengthSnippet(BaseSnippet):
 	def __init__(self, *args):
 		super().__init__(*args)
 		self.end = self._end
+		self._dur_expression = SnippetDuration(self)
+		self.end.add_action(self._dur_expression.update)
 	
 	def stop_recording(self):
 		dur_in_samples = int(self.dur * self.template_table.getSamplingRate())
 		self.table = pyo.DataTable(dur_in_samples, chnls=2)
 		self.table.copyData(self.template_table)
 		del self.template_table
+		self.takes.add(self.table)
 	
 	@property
 	def dur(self):
-		try:
+		if self._dur_expression.resolved:
+			return self._dur_expression.compute()
+		elif self.start.happened and self.end.happened:
 			return self.end.time - self.start.time
-		except:
-			return UndeterminedDuration(self)
+		else:
+			return self._dur_expression
 
 
 class DependentLengthSnippet(BaseSnippet):
@@ -170,7 +256,7 @@ class LiveDependentLengthSnippet(LiveSnippet, DependentLengthSnippet):
 	def _define_events(self):
 		super()._instantiate_raw_source()
 		if self.recording:
-			if not isinstance(self.dur, UndeterminedDuration):
+			if not isinstance(self.dur, DurationExpression):
 				self.table = pyo.NewTable(self.dur, chnls=2)
 				self.recorder = pyo.TableRec(self._raw_source, self.table)
 			else:
@@ -179,15 +265,17 @@ class LiveDependentLengthSnippet(LiveSnippet, DependentLengthSnippet):
 					self.table = pyo.NewTable(self.dur, chnls=2)
 					self.recorder = pyo.TableRec(self._raw_source, self.table)
 				self.start.add_action(create_table)
+			def add_take():
+				self.takes.add(self.table)
 			self.start.add_action(self.start_recording, self.signal_recording_start)
-			self.end.add_action(self.signal_recording_stop)
+			self.end.add_action(add_take, self.signal_recording_stop)
 		if self.monitoring:
 			self.start.add_action(self.start_monitoring, self.signal_monitoring_start)
 			self.end.add_action(self.stop_monitoring, self.signal_monitoring_stop)
 
 
 class ClonedDependentLengthSnippet(ClonedSnippet, DependentLengthSnippet):
-	def __init__(self, source, start, end, dur, repeat, fx, monitoring):
+	def __init__(self, source, start, end, dur, repeat, fx, monitoring, send):
 		# We're calling the parent class methods explicitly here for two reasons:
 		# 1. To ensure that they're called in the specified order, since Python
 		#    calls parent __init__ methods in *opposite* method resolution order
@@ -195,14 +283,16 @@ class ClonedDependentLengthSnippet(ClonedSnippet, DependentLengthSnippet):
 		# 2. To pass self.dur rather than dur to DependentLengthSnippet, since
 		#    ClonedSnippet potentially assigns a value different than dur to
 		#    self.dur
-		ClonedSnippet.__init__(self, source, start, end, dur, repeat, fx, monitoring)
-		DependentLengthSnippet.__init__(self, source, start, end, self.dur, repeat, fx, monitoring)
+		ClonedSnippet.__init__(self, source, start, end, dur, repeat, fx, monitoring, send)
+		DependentLengthSnippet.__init__(self, source, start, end, self.dur, repeat, fx, monitoring, send)
 	
 	def _define_events(self):
 		if not self.recording:
 			def clone_table():
 				self.table = self.source.table
 			self.source.end.add_action(clone_table)
+			# follow the source's active take, e.g. when it is retaken
+			self.source.takes.subscribe(self.swap_table)
 			if self.repeat == 1:
 				self.start.add_action(self.start_playback, self.start_monitoring)
 			elif self.repeat != 0:
@@ -0,0 +1,254 @@
+'''
+Soak test for the audio engine.
+
+Runs a looping song for hours of simulated time, using an OfflineClock and an
+audio server in manual mode, so no audio device is needed and it runs much
+faster than real time. The song is started once, the button is pressed at a
+fixed interval until no more presses are expected, and the loops then keep
+playing for the rest of the test. While they play, the resident memory, the
+number of live pyo objects and server streams, the number of threads and of
+pending timers (the timer threads a RealClock would be running) and the drift
+of the loop boundaries from where they should be since the loop started (in
+samples) are sampled at a fixed interval. The test fails if any of them keeps
+growing.
+
+With `--rebuild`, the song is instead built from scratch, run for one
+interval and stopped over and over, which checks that stopping a program
+releases everything it allocated.
+
+	python3 -m laszlo.engine.soak --hours 2
+	python3 -m laszlo.engine.soak --hours 2 --rebuild
+'''
+
+from ..compiler import Program
+from . import events
+from .clocks import OfflineClock
+from .snippets import ClonedSnippet
+import argparse
+import gc
+import math
+import os
+import sys
+import threading
+import pyo
+
+
+__all__ = ['SONG', 'soak']
+
+
+# A song with several loops of different lengths, one of which is recorded
+# with a computed duration, plus a clone whose duration is a sum of durations
+SONG = {
+	'program': {
+		'title': 'Soak test',
+		'tracks': [
+			{
+				'id': 't1',
+				'name': 'loops',
+				'snippets': [
+					{'id': 's1', 'source': 'input', 'start': 'boot', 'end': 'button_press'},
+					{'id': 's2', 'source': '$s1', 'start': '$s1.end', 'repeat': '-1'},
+					{'id': 's3', 'source': 'input', 'start': '$s1.end', 'dur': '$s1.dur * 2'},
+					{'id': 's4', 'source': '$s3', 'start': '$s3.end', 'repeat': '-1'}
+				]
+			},
+			{
+				'id': 't2',
+				'name': 'overdubs',
+				'snippets': [
+					{'id': 's5', 'source': 'input', 'start': '$s1.end', 'end': 'button_press'},
+					{'id': 's6', 'source': '$s5', 'start': '$s5.end', 'repeat': '-1'},
+					{'id': 's7', 'source': '$s3', 'start': '$s4.end', 'dur': '$s1.dur + $s5.dur'}
+				]
+			}
+		]
+	},
+	'version': '0.1.0'
+}
+
+
+def _rss():
+	try:
+		with open('/proc/self/statm') as file:
+			return int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+	except OSError:
+		import resource
+		# the peak rather than the current size, but it still shows growth
+		return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _pyo_objects():
+	gc.collect()
+	return sum(isinstance(obj, pyo.PyoObjectBase) for obj in gc.get_objects())
+
+
+class _DriftProbe:
+	'''
+	Compares the loop boundaries of looping clones with where they should be
+	according to their start and table length.
+	'''
+	def __init__(self, clock):
+		self.clock = clock
+		self.triggers = []
+		self.max_drift = 0
+	
+	def watch(self, snippet):
+		start_playback_loop = snippet.start_playback_loop
+		def watched_start_playback_loop():
+			start_playback_loop()
+			start = self.clock.samples
+			size = snippet.table.getSize()
+			boundaries = [0, None]  # boundaries seen, last block with one
+			def boundary():
+				# the trigger fires once per channel, so only count each block
+				# once
+				if boundaries[1] == self.clock.samples:
+					return
+				boundaries[0] += 1
+				boundaries[1] = self.clock.samples
+				# measured from the start of the loop, so that drift adds up
+				# over the whole run
+				expected = start + boundaries[0] * size
+				# the boundary should lie within the block being processed
+				drift = max(self.clock.samples - expected, expected - (self.clock.samples + self.clock.block_size - 1), 0)
+				self.max_drift = max(self.max_drift, drift)
+			self.triggers.append(pyo.TrigFunc(snippet.player['trig'], boundary))
+		snippet.start_playback_loop = watched_start_playback_loop
+	
+	def take(self):
+		'''
+		Return the largest drift since the last call.
+		'''
+		drift, self.max_drift = self.max_drift, 0
+		return drift
+	
+	def release(self):
+		for trigger in self.triggers:
+			trigger.stop()
+		self.triggers = []
+
+
+def _start(song, server, clock, press_interval):
+	handler = events._handler
+	program = song.as_engine()
+	program.server = server
+	probe = _DriftProbe(clock)
+	for track in program.tracks:
+		for snippet in track.snippets:
+			if isinstance(snippet, ClonedSnippet) and snippet.repeat not in (0, 1):
+				probe.watch(snippet)
+	program._define_events()
+	def press():
+		if handler.is_expecting_event(events.ButtonPress):
+			handler.press()
+			clock.call_later(press_interval, press)
+	clock.call_later(press_interval, press)
+	handler.emit_event(events.Boot)
+	return program, probe
+
+
+def _stop(program, probe):
+	program.stop()
+	probe.release()
+
+
+def _sample(server, clock, probe):
+	return {
+		'rss': _rss(),
+		'pyo_objects': _pyo_objects(),
+		'streams': server.getNumberOfStreams(),
+		'threads': threading.active_count(),
+		'timers': clock.pending(),
+		'drift': probe.take()
+	}
+
+
+def _grows(values, tolerance = 0):
+	# compare the second half of the samples with the first one, so that a
+	# one-off increase (e.g. a cache filling up) isn't mistaken for a leak
+	half = len(values) // 2
+	return half > 0 and max(values[half:]) > max(values[:half]) + tolerance
+
+
+def soak(song = None, hours = 1, interval = 60, press_interval = 4, warmup = 2, rss_tolerance = 8 * 2**20, rebuild = False, sampling_rate = 44100, buffer_size = 256, report = print):
+	'''
+	Run the soak test and return a list of the names of the metrics that grew
+	unboundedly (an empty list means the test passed).
+	
+	song: A compiler Program. Default is SONG (optional)
+	hours: The simulated duration of the test
+	interval: The simulated time in seconds between samples
+	press_interval: The time in seconds between button presses
+	warmup: The number of samples to skip before checking for growth
+	rss_tolerance: How much (in bytes) the resident memory may grow
+	rebuild: Whether to build, run and stop the song anew for every sample,
+		rather than running it once for the whole test
+	'''
+	song = song or Program.fromDict(SONG)
+	server = pyo.Server(sr=sampling_rate, buffersize=buffer_size, audio='manual').boot()
+	server.start()
+	clock = OfflineClock(server)
+	previous_clock = events._handler.clock
+	events._handler.clock = clock
+	events._handler.reset()
+	running = None
+	samples = []
+	try:
+		for index in range(math.ceil(hours * 3600 / interval)):
+			if running is None:
+				running = _start(song, server, clock, press_interval)
+			clock.advance(interval)
+			if rebuild:
+				# the timers and drift belong to the run, the rest is sampled
+				# once it has been stopped
+				timers, drift = clock.pending(), running[1].take()
+				_stop(*running)
+				running = None
+				sample = _sample(server, clock, _DriftProbe(clock))
+				sample.update(timers=timers, drift=drift)
+			else:
+				sample = _sample(server, clock, running[1])
+			report(
+				f'{clock.time() / 3600:6.2f}h  rss {sample["rss"] / 2**20:7.1f} MiB  '
+				f'pyo objects {sample["pyo_objects"]:5}  streams {sample["streams"]:5}  '
+				f'threads {sample["threads"]:3}  timers {sample["timers"]:3}  '
+				f'drift {sample["drift"]:5} samples'
+			)
+			if index >= warmup:
+				samples.append(sample)
+	finally:
+		if running is not None:
+			_stop(*running)
+		events._handler.reset()
+		events._handler.clock = previous_clock
+		server.stop()
+		server.shutdown()
+	tolerances = {'rss': rss_tolerance, 'drift': buffer_size}
+	return [
+		metric
+		for metric in ('rss', 'pyo_objects', 'streams', 'threads', 'timers', 'drift')
+		if _grows([sample[metric] for sample in samples], tolerances.get(metric, 0))
+	]
+
+
+def main():
+	parser = argparse.ArgumentParser(description='Run a looping song for hours of simulated time and check for leaks and drift.')
+	parser.add_argument('input', nargs='?', help='the .laszlo file to run (default: a built-in looping song)')
+	parser.add_argument('--hours', type=float, default=1, help='simulated duration of the test (default: %(default)s)')
+	parser.add_argument('--interval', type=float, default=60, help='simulated seconds between samples (default: %(default)s)')
+	parser.add_argument('--press-interval', type=float, default=4, help='seconds between button presses (default: %(default)s)')
+	parser.add_argument('--warmup', type=int, default=2, help='samples to skip before checking for growth (default: %(default)s)')
+	parser.add_argument('--rss-tolerance', type=float, default=8, help='allowed memory growth in MiB (default: %(default)s)')
+	parser.add_argument('--rebuild', action='store_true', help='build, run and stop the song anew for every sample, to check that stopping releases everything')
+	args = parser.parse_args()
+	song = Program.fromFile(args.input) if args.input else None
+	failed = soak(song, args.hours, args.interval, args.press_interval, args.warmup, args.rss_tolerance * 2**20, args.rebuild)
+	if failed:
+		print(f'FAILED: unbounded growth of {", ".join(failed)}')
+		sys.exit(1)
+	else:
+		print('OK')
+
+
+if __name__ == '__main__':
+	main()
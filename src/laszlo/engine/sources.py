@@ -0,0 +1,305 @@
+'''
+Event sources, i.e. the controls that trigger button presses.
+
+Each source listens for messages in its own thread and hands them to
+`laszlo.engine.events.EventHandler.dispatch`, either as the name of a button
+(None for the main button/footswitch) or as the id of a specific event.
+'''
+
+from .snippets import raspberry
+import os
+import select
+import socket
+import struct
+import sys
+import threading
+import time
+
+try:
+	import mido
+except ModuleNotFoundError:
+	mido = None
+
+
+__all__ = [
+	'EventSource',
+	'KeyboardSource',
+	'GPIOSource',
+	'OSCSource',
+	'MIDISource',
+	'default_sources',
+	'parse_osc',
+	'encode_osc',
+	'send_osc'
+]
+
+
+DEFAULT_OSC_PORT = 9000
+
+
+class EventSource:
+	def start(self, handler):
+		'''
+		Start listening for messages and dispatch them to `handler`.
+		'''
+		self.handler = handler
+		self.thread = threading.Thread(target=self.listen, daemon=True)
+		self.thread.start()
+	
+	def listen(self):
+		raise NotImplementedError
+	
+	def stop(self):
+		pass
+
+
+class KeyboardSource(EventSource):
+	'''
+	Presses the main button whenever Enter is pressed. Entering a name first
+	presses the button with that name instead.
+	'''
+	# stdin is polled rather than read with a blocking `input()`, so that the
+	# thread can be stopped without it swallowing a line afterwards
+	poll_interval = 0.1
+	
+	def start(self, handler):
+		self.stopped = threading.Event()
+		super().start(handler)
+	
+	def _read_lines(self):
+		if os.name == 'nt':
+			import msvcrt
+			while not self.stopped.is_set():
+				if msvcrt.kbhit():
+					line = sys.stdin.readline()
+					if not line:
+						return
+					yield line
+				else:
+					time.sleep(self.poll_interval)
+		else:
+			fd = sys.stdin.fileno()
+			buffer = b''
+			while not self.stopped.is_set():
+				if not select.select([fd], [], [], self.poll_interval)[0]:
+					continue
+				data = os.read(fd, 4096)
+				if not data:
+					return
+				*lines, buffer = (buffer + data).split(b'\n')
+				for line in lines:
+					yield line.decode(errors='replace')
+	
+	def listen(self):
+		for line in self._read_lines():
+			self.handler.dispatch(line.strip() or None)
+	
+	def stop(self):
+		self.stopped.set()
+		self.thread.join()
+
+
+class GPIOSource(EventSource):
+	'''
+	Buttons/footswitches connected to the GPIO pins of a Raspberry Pi.
+	
+	buttons: A dict mapping button names to GPIO pin numbers. Default is the
+		main button on pin 25 (optional)
+	'''
+	def __init__(self, buttons = None):
+		self.buttons = buttons or {None: 25}
+	
+	def start(self, handler):
+		from . import snippets
+		self.handler = handler
+		self.devices = []
+		for name, pin in self.buttons.items():
+			# the main button is already set up by `laszlo.engine.snippets`
+			device = snippets.button if pin == 25 else snippets.Button(pin)
+			device.when_pressed = lambda name=name: handler.dispatch(name)
+			self.devices.append(device)
+	
+	def stop(self):
+		for device in self.devices:
+			device.when_pressed = None
+
+
+def _read_osc_string(data, offset):
+	end = data.index(b'\0', offset)
+	# strings are null-terminated and padded to a multiple of 4 bytes
+	return data[offset:end].decode(), (end // 4 + 1) * 4
+
+
+def _osc_string(string):
+	data = string.encode() + b'\0'
+	return data + b'\0' * (-len(data) % 4)
+
+
+def parse_osc(data):
+	'''
+	Parse an OSC message into its address and list of arguments. Only int,
+	float, string and boolean arguments are supported.
+	'''
+	address, offset = _read_osc_string(data, 0)
+	if not address.startswith('/'):
+		raise ValueError('not an OSC message')
+	args = []
+	if offset < len(data):
+		tags, offset = _read_osc_string(data, offset)
+		for tag in tags[1:]:
+			if tag == 'i':
+				args.append(struct.unpack_from('>i', data, offset)[0])
+				offset += 4
+			elif tag == 'f':
+				args.append(struct.unpack_from('>f', data, offset)[0])
+				offset += 4
+			elif tag == 's':
+				string, offset = _read_osc_string(data, offset)
+				args.append(string)
+			elif tag in 'TF':
+				args.append(tag == 'T')
+			else:
+				raise ValueError(f'unsupported OSC type tag {tag!r}')
+	return address, args
+
+
+def encode_osc(address, *args):
+	'''
+	Encode an OSC message, the reverse of `parse_osc`.
+	'''
+	tags = ','
+	data = b''
+	for arg in args:
+		if type(arg) == bool:
+			tags += 'T' if arg else 'F'
+		elif type(arg) == int:
+			tags += 'i'
+			data += struct.pack('>i', arg)
+		elif type(arg) == float:
+			tags += 'f'
+			data += struct.pack('>f', arg)
+		else:
+			tags += 's'
+			data += _osc_string(str(arg))
+	return _osc_string(address) + _osc_string(tags) + data
+
+
+def send_osc(address, *args, host = '127.0.0.1', port = DEFAULT_OSC_PORT):
+	'''
+	Send an OSC message over UDP, e.g. `send_osc('/laszlo/press')`.
+	'''
+	with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+		sock.sendto(encode_osc(address, *args), (host, port))
+
+
+class OSCSource(EventSource):
+	'''
+	Listens for OSC messages over UDP. Understands the following addresses:
+	
+	/laszlo/press: Press the main button, or the button named by the first
+		argument
+	/laszlo/press/<button>: Press the named button
+	/laszlo/event/<id>: Trigger the event with the given id
+	
+	host: The address to listen on. Default is localhost only (optional)
+	port: The UDP port to listen on (optional)
+	'''
+	# closing the socket doesn't wake up a thread blocked in `recv()`, so it
+	# polls instead, like KeyboardSource
+	poll_interval = 0.1
+	
+	def __init__(self, host = '127.0.0.1', port = DEFAULT_OSC_PORT):
+		self.host = host
+		self.port = port
+	
+	def start(self, handler):
+		# the port is only taken while the source is running
+		self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+		self.socket.bind((self.host, self.port))
+		self.socket.settimeout(self.poll_interval)
+		self.stopped = threading.Event()
+		super().start(handler)
+	
+	def listen(self):
+		while not self.stopped.is_set():
+			try:
+				data = self.socket.recv(65536)
+			except socket.timeout:
+				continue
+			try:
+				address, args = parse_osc(data)
+			except (ValueError, IndexError, struct.error):
+				continue  # ignore malformed messages and OSC bundles
+			self.handle(address, args)
+	
+	def handle(self, address, args):
+		parts = address.split('/', 3)[1:]
+		if parts[:2] == ['laszlo', 'press']:
+			if len(parts) == 3:
+				self.handler.dispatch(parts[2])
+			else:
+				self.handler.dispatch(str(args[0]) if args else None)
+		elif parts[:2] == ['laszlo', 'event']:
+			if len(parts) == 3:
+				self.handler.dispatch(id=parts[2])
+			elif args:
+				self.handler.dispatch(id=str(args[0]))
+	
+	def stop(self):
+		self.stopped.set()
+		self.thread.join()
+		self.socket.close()
+
+
+class MIDISource(EventSource):
+	'''
+	Listens for MIDI notes, controller changes and program changes. Requires
+	the `mido` package (and one of its backends, such as `python-rtmidi`).
+	
+	port: The name of the MIDI input port. Default is the system's default
+		port (optional)
+	buttons: A dict mapping messages, such as 'note 60', 'cc 64' or
+		'program 3', to button names. If None, any of these messages presses
+		the main button (optional)
+	'''
+	def __init__(self, port = None, buttons = None):
+		if mido is None:
+			raise ModuleNotFoundError('MIDI input requires the `mido` package')
+		self.port_name = port
+		self.buttons = buttons
+	
+	def start(self, handler):
+		# mido calls the callback from its own thread
+		self.handler = handler
+		self.port = mido.open_input(self.port_name, callback=self.handle)
+	
+	@staticmethod
+	def message_key(message):
+		if message.type == 'note_on' and message.velocity > 0:
+			return f'note {message.note}'
+		elif message.type == 'control_change' and message.value >= 64:
+			return f'cc {message.control}'
+		elif message.type == 'program_change':
+			return f'program {message.program}'
+	
+	def handle(self, message):
+		key = self.message_key(message)
+		if key is None:
+			return
+		elif self.buttons is None:
+			self.handler.dispatch()
+		elif key in self.buttons:
+			self.handler.dispatch(self.buttons[key])
+	
+	def stop(self):
+		self.port.close()
+
+
+def default_sources():
+	'''
+	The GPIO footswitch on a Raspberry Pi, the keyboard otherwise.
+	'''
+	if raspberry:
+		return [GPIOSource()]
+	else:
+		return [KeyboardSource()]
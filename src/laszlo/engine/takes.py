@@ -0,0 +1,225 @@
+'''
+Take history of live snippets.
+
+Every time a live snippet is (re-)recorded, the new table is added to the
+snippet's TakeStore as a new take, which becomes the active one. Undo and
+redo switch between takes. To keep memory bounded, only the most recent takes
+are kept in memory, while older ones are compressed and moved to disk until
+they become active again.
+
+Takes recorded during the performance are finished on pyo's audio thread,
+which must not block, so they are added on a worker thread instead
+(`TakeStore.add_later`). The store is locked while it changes.
+'''
+
+import os
+import queue
+import shutil
+import tempfile
+import threading
+import zlib
+import pyo
+
+
+__all__ = ['DEFAULT_BUDGET', 'TakeStore']
+
+
+# How many bytes of inactive takes each snippet keeps in memory
+DEFAULT_BUDGET = 64 * 2**20
+
+# The size of a sample in bytes, see `laszlo.compiler.analysis.analyze`
+_sample_size = 4
+
+# How many bytes are compressed or read from disk at a time
+_chunk_size = 2**20
+
+
+class _Take:
+	def __init__(self, table):
+		self.table = table
+		self.path = None
+		self.size = table.getSize()
+		self.chnls = len(table)
+	
+	@property
+	def memory(self):
+		return self.size * self.chnls * _sample_size if self.table is not None else 0
+	
+	def evict(self, path):
+		# the samples are compressed straight from the table's memory, without
+		# copying them into lists first
+		with open(path, mode='wb') as file:
+			for chnl in range(self.chnls):
+				samples = memoryview(self.table.getBuffer(chnl)).cast('B')
+				compressor = zlib.compressobj()
+				for offset in range(0, len(samples), _chunk_size):
+					file.write(compressor.compress(samples[offset:offset + _chunk_size]))
+				file.write(compressor.flush())
+		self.path = path
+		self.table = None
+	
+	def load(self):
+		if self.table is None:
+			table = pyo.DataTable(self.size, chnls=self.chnls)
+			with open(self.path, mode='rb') as file:
+				data = b''
+				# the channels were compressed separately, so decompress one
+				# stream after the other, straight into the table's memory
+				for chnl in range(self.chnls):
+					samples = memoryview(table.getBuffer(chnl)).cast('B')
+					decompressor = zlib.decompressobj()
+					offset = 0
+					while not decompressor.eof:
+						data = data or file.read(_chunk_size)
+						if not data:
+							raise Exception(f'oh no, take file {self.path} is truncated')
+						chunk = decompressor.decompress(data)
+						samples[offset:offset + len(chunk)] = chunk
+						offset += len(chunk)
+						data = decompressor.unused_data
+			self.table = table
+		return self.table
+
+
+class TakeStore:
+	'''
+	The takes of a live snippet.
+	
+	budget: How many bytes of inactive takes to keep in memory. The active
+		take is always kept in memory (optional)
+	'''
+	def __init__(self, budget = None):
+		self.budget = DEFAULT_BUDGET if budget is None else budget
+		self.takes = []
+		self.index = -1
+		self.listeners = []
+		self._directory = None
+		self._lock = threading.RLock()
+		self._queue = queue.SimpleQueue()
+		self._worker = None
+	
+	def __len__(self):
+		return len(self.takes)
+	
+	@property
+	def table(self):
+		'''
+		The table of the active take.
+		'''
+		with self._lock:
+			if self.index < 0:
+				return None
+			return self.takes[self.index].load()
+	
+	def subscribe(self, listener):
+		'''
+		Call `listener` with the table of the active take whenever it changes.
+		'''
+		self.listeners.append(listener)
+	
+	def _activate(self, index):
+		self.index = index
+		table = self.table
+		self._enforce_budget()
+		for listener in self.listeners:
+			listener(table)
+	
+	def add(self, table):
+		'''
+		Add a take and make it the active one. Takes that were undone are
+		discarded.
+		'''
+		with self._lock:
+			for take in self.takes[self.index + 1:]:
+				if take.path is not None:
+					os.remove(take.path)
+			self.takes[self.index + 1:] = [_Take(table)]
+			self._activate(len(self.takes) - 1)
+	
+	def start_worker(self):
+		'''
+		Start the worker thread that `add_later` hands takes to, unless it is
+		already running. This is done separately because `add_later` has to
+		return quickly, and only for snippets that are actually retaken.
+		'''
+		if self._worker is None:
+			self._worker = threading.Thread(target=self._work, daemon=True)
+			self._worker.start()
+	
+	def add_later(self, table, callback = None):
+		'''
+		Like `add`, but return immediately and add the take on the worker
+		thread (see `start_worker`), after calling `callback` there. Unlike
+		the other methods, this is safe to call from pyo's audio thread, e.g.
+		from a TrigFunc.
+		'''
+		self._queue.put((table, callback))
+	
+	def _work(self):
+		while True:
+			table, callback = self._queue.get()
+			if table is None:
+				return
+			with self._lock:
+				if callback is not None:
+					callback()
+				self.add(table)
+	
+	def undo(self):
+		'''
+		Go back to the previous take. Returns False if there is none.
+		'''
+		with self._lock:
+			if self.index < 1:
+				return False
+			self._activate(self.index - 1)
+			return True
+	
+	def redo(self):
+		'''
+		Go forward to the take that was last undone. Returns False if there is
+		none.
+		'''
+		with self._lock:
+			if self.index >= len(self.takes) - 1:
+				return False
+			self._activate(self.index + 1)
+			return True
+	
+	def _enforce_budget(self):
+		# evict the takes furthest from the active one first, since they are
+		# the least likely to be needed again soon
+		inactive = [
+			take
+			for index, take in sorted(enumerate(self.takes), key=lambda item: abs(item[0] - self.index))
+			if index != self.index
+		]
+		memory = sum(take.memory for take in inactive)
+		while memory > self.budget and inactive:
+			take = inactive.pop()
+			if take.table is None:
+				continue
+			memory -= take.memory
+			if take.path is None:
+				if self._directory is None:
+					self._directory = tempfile.mkdtemp(prefix='laszlo-takes-')
+				take.evict(os.path.join(self._directory, f'{id(take)}.take'))
+			else:
+				# the take is still on disk from when it was last evicted
+				take.table = None
+	
+	def close(self):
+		'''
+		Delete the takes stored on disk.
+		'''
+		if self._worker is not None:
+			# let the worker add the takes that are still queued first
+			self._queue.put((None, None))
+			self._worker.join()
+			self._worker = None
+		with self._lock:
+			if self._directory is not None:
+				shutil.rmtree(self._directory, ignore_errors=True)
+				self._directory = None
+			self.takes = []
+			self.index = -1
@@ -1,6 +1,4 @@
 import webview
-from tempfile import TemporaryDirectory
-from shutil import copy
 import os.path
 import subprocess
 import sys
@@ -11,10 +9,61 @@ from ..compiler import Program
 __all__ = ['open_editor']
 
 
+# The files making up the editor
+assets = ['editor.html', 'main.js', 'editor.css', 'program.js', 'infopanel.js', 'AreaKilometer50.ttf']
+
+
+def asset_dir():
+	'''
+	The directory that the editor is served from. All windows share it, and
+	the program is passed to each of them through the API rather than being
+	written to a file.
+	'''
+	return os.path.dirname(__file__)
+
+
 class API:
-	def __init__(self, window = None, fname = None):
+	'''
+	The methods that the editor can call. The editor's program is mirrored
+	by `self.program`, which is kept up to date by the editor sending only the
+	changes made since the last sync (see `sync`). `self.version` is the
+	editor's version number of the program that `self.program` corresponds to,
+	or None if it needs to be resent in full.
+	'''
+	def __init__(self, window = None, fname = None, program = None):
 		self.window = window
 		self.fname = fname or ''
+		self.program = program
+		self.version = 0 if program is not None else None
+	
+	def load(self):
+		if self.program is not None:
+			return {'program': self.program.as_json(), 'version': self.version}
+		else:
+			return None
+	
+	def sync(self, patch):
+		'''
+		Apply the changes the editor has made since version `patch['base']`.
+		Returns False if that isn't the version that we have, in which case
+		the editor has to send the whole program with `reset`.
+		'''
+		if self.program is None or patch['base'] != self.version:
+			return False
+		try:
+			self.program.apply_changes(patch['changes'])
+		except Exception:
+			# we don't know which state the program has been left in, so
+			# request the whole program on the next sync
+			self.version = None
+			raise
+		self.version = patch['version']
+		return True
+	
+	def reset(self, program, version):
+		self.program = Program.fromJSON(program)
+		self.version = version
+		return True
 	
 	def new(self):
 		open_editor(with_start=False)
@@ -38,16 +87,16 @@ class API:
 		else:
 			return False
 	
-	def save(self, output):
+	def save(self):
 		if self.fname:
-			converted_output = Program.fromJSON(output).as_yaml()
-			with open(self.fname, mode='w') as file:
+			converted_output = self.program.as_yaml()
+			with open(self.fname, mode='w', encoding='utf-8') as file:
 				file.write(converted_output)
 				return True
 		else:
-			return self.save_as(output)
+			return self.save_as()
 	
-	def save_as(self, output):
+	def save_as(self):
 		dest = self.window.create_file_dialog(
 			webview.SAVE_DIALOG,
 			directory = os.path.dirname(self.fname),
@@ -58,15 +107,15 @@ class API:
 			)
 		)
 		if dest:
-			converted_output = Program.fromJSON(output).as_yaml()
-			with open(dest[0], mode='w') as file:
+			converted_output = self.program.as_yaml()
+			with open(dest[0], mode='w', encoding='utf-8') as file:
 				file.write(converted_output)
 			return True
 		else:
 			return False
 	
-	def run(self, output):
-		converted_output = Program.fromJSON(output).as_python()
+	def run(self):
+		converted_output = self.program.as_python()
 		if getattr(sys, 'frozen', False) and hasattr(sys, '_MEIPASS'):
 			# If this condition is true, we're running in a PyInstaller bundle,
 			# which means that `sys.executable` points to the generated binary
@@ -88,7 +137,7 @@ class API:
 			subprocess.run(command, check=True, creationflags=subprocess.CREATE_NEW_CONSOLE)
 		return True
 	
-	def export_as_python(self, output):
+	def export_as_python(self):
 		dest = self.window.create_file_dialog(
 			webview.SAVE_DIALOG,
 			directory = os.path.dirname(self.fname),
@@ -96,8 +145,8 @@ class API:
 			file_types = ('Python files (*.py)',)
 		)
 		if dest:
-			converted_output = Program.fromJSON(output).as_python()
-			with open(dest[0], mode='w') as file:
+			converted_output = self.program.as_python()
+			with open(dest[0], mode='w', encoding='utf-8') as file:
 				file.write(converted_output+'\n')
 			return True
 		else:
@@ -110,33 +159,24 @@ def open_editor(input = None, with_start = True):
 		if type(input) == str:
 			program = Program.fromYAML(input)
 			fname = None
+		elif input is not sys.stdin:
+			input.close()
+			program = Program.fromFile(input.name)
+			fname = input.name
 		else:
 			program = Program.fromYAML(input.read())
-			fname = input.name if input is not sys.stdin else None
+			fname = None
 		title = program.attrs.get('title', 'untitled program')
-		json = program.as_json()
 	else:
+		program = None
 		fname = None
 		title = 'untitled program'
-		json = ''
-	# Create temporary directory
-	temp_dir = TemporaryDirectory(prefix='laszlo.')
-	# Copy over website files
-	def script_dir(file):
-		return os.path.join(os.path.dirname(__file__), file)
-	url = copy(script_dir('editor.html'), temp_dir.name)
-	js = copy(script_dir('main.js'), temp_dir.name)
-	assets = ['editor.css', 'program.js', 'infopanel.js', 'AreaKilometer50.ttf']
-	for asset in assets:
-		copy(script_dir(asset), temp_dir.name)
-	# Append input to JS file as global variable
-	with open(js, mode='a') as file:
-		file.write(f'input = {repr(json)};\n')
-	# Create window
-	api = API(fname=fname)
+	# Create window. The editor requests the program through the API once it
+	# has loaded
+	api = API(fname=fname, program=program)
 	window = webview.create_window(
 		title = f'{title} - Laszlo Editor',
-		url = url,
+		url = os.path.join(asset_dir(), 'editor.html'),
 		js_api = api,
 		# TODO: get client screen resolution, perhaps using pyautogui.size, or
 		# package screeninfo, or with tkinter
@@ -146,9 +186,6 @@ def open_editor(input = None, with_start = True):
 		confirm_close = True
 	)
 	api.window = window
-	window.closed += temp_dir.cleanup
-	if fname:
-		window.closed += file.close
 	if with_start:
 		webview.start()
 
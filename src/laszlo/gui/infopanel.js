@@ -390,7 +390,7 @@ class InfoPanel {
 					}
 			}
 		}
-		this.containingProgram.updateAll();
+		this.containingProgram.updateChanged();
 		this.containingProgram.clearSelection();
 	}
 	
@@ -512,7 +512,7 @@ class InfoPanel {
 		this.selectedSnippets.forEach(
 			snippet => snippet.remove()
 		);
-		this.containingProgram.updateAll();
+		this.containingProgram.updateChanged();
 		this.containingProgram.clearSelection();
 	}
 		
@@ -539,10 +539,10 @@ class InfoPanel {
 			for (let snippetRef of this.table.querySelectorAll(".snippet-ref")) {
 				let referencedSnippet = this.containingProgram.getSnippetById(snippetRef.dataset.refId);
 				let refPeekOn = () => {
-					referencedSnippet.container.classList.add("ref-peek");
+					referencedSnippet.container?.classList.add("ref-peek");
 				};
 				let refPeekOff = () => {
-					referencedSnippet.container.classList.remove("ref-peek");
+					referencedSnippet.container?.classList.remove("ref-peek");
 				};
 				snippetRef.onmouseenter = refPeekOn;
 				snippetRef.onmouseleave = refPeekOff;
@@ -1,42 +1,63 @@
 "use strict";
 
 // Global variables
-var input, program;
+var program;
 
-window.addEventListener("DOMContentLoaded", () => {
-	let options = {
-		mixerContainer: document.querySelector("#mixer"),
-		workspaceContainer: document.querySelector("#workspace"),
-		infoPanelContainer: document.querySelector("#info-panel")
+// The program is requested through the API, which only becomes available
+// after the page has loaded
+window.addEventListener("pywebviewready", () => {
+	pywebview.api.load().then(input => {
+		let options = {
+			mixerContainer: document.querySelector("#mixer"),
+			workspaceContainer: document.querySelector("#workspace"),
+			infoPanelContainer: document.querySelector("#info-panel")
+		};
+		if (input) {
+			program = Program.fromJSON(input.program, options);
+			program.version = program.syncedVersion = input.version;
+		} else {
+			program = new Program({ title: "untitled program" }, [], options);
+			program.addTrack("untitled track");
+		}
+		addMainMenuHandlers();
+	});
+});
+
+function addMainMenuHandlers() {
+	let showMessage = function(message) {
+		program.infoPanel.selectionCount.querySelector("div").innerText = message;
 	};
-	if (input) {
-		program = Program.fromJSON(input, options);
-	} else {
-		program = new Program({ title: "untitled program" }, [], options);
-		program.addTrack("untitled track");
-	}
 	
-	let addMainMenuHandler = function(action, argumentProviders = [], messageOnEffect = null) {
+	let addMainMenuHandler = function(action, messageOnEffect = null, needsSync = true) {
 		document.querySelector(`#main-menu .${action}`).onclick = () => {
 			// for some reason pywebview doesn't know the `replaceAll` string method,
 			// so instead we have to use `replace` with a regex
 			let apiMethod = action.replace(new RegExp("-", "g"), "_")
-			let args = argumentProviders.map(provider => provider());
-			pywebview.api[apiMethod](...args)
+			// only the changes made since the last action are sent over. If
+			// applying them fails, the API discards its copy of the program,
+			// so syncing again sends the whole program instead
+			let synced = needsSync
+				? program.sync().catch(error => {
+					showMessage(`error while syncing: ${error}`);
+					return program.sync();
+				})
+				: Promise.resolve();
+			synced
+				.then(() => pywebview.api[apiMethod]())
 				.then(hadEffect => {
 					if (hadEffect && messageOnEffect) {
-						program.infoPanel.selectionCount.querySelector("div").innerText = messageOnEffect;
+						showMessage(messageOnEffect);
 					}
 				}).catch(error => {
-					alert(error);
+					showMessage(`error: ${error}`);
 				});
 		};
 	};
 	
-	addMainMenuHandler("new");
-	addMainMenuHandler("open");
-	addMainMenuHandler("save", [program.toJSON.bind(program)], "file saved.");
-	addMainMenuHandler("save-as", [program.toJSON.bind(program)], "file saved.");
-	addMainMenuHandler("run", [program.toJSON.bind(program)]);
-	addMainMenuHandler("export-as-python", [program.toJSON.bind(program)], "file exported.");
-});
+	addMainMenuHandler("new", null, false);
+	addMainMenuHandler("open", null, false);
+	addMainMenuHandler("save", "file saved.");
+	addMainMenuHandler("save-as", "file saved.");
+	addMainMenuHandler("run");
+	addMainMenuHandler("export-as-python", "file exported.");
+}
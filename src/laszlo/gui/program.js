@@ -7,6 +7,21 @@ class Program {
 		[...this.tracks, ...this.snippets].forEach(item => {
 			item.containingProgram = this;
 		});
+		// Edits are recorded as a log of changes, each numbered with the
+		// program version it results in, so that only the changes made since
+		// the last sync have to be sent to the Python side
+		this.version = 0;
+		this.syncedVersion = null;
+		this.changes = [];
+		// The workspace only contains the snippets that are (nearly) in view.
+		// Snippet positions are cached, and after an edit only the positions
+		// of the edited snippets and the snippets depending on them are
+		// recomputed and re-rendered.
+		this._index = null;
+		this.layoutCache = new Map();
+		this.renderedSnippets = new Map();
+		this.dirtySnippetIds = new Set();
+		this.renderScheduled = false;
 		this.firstLoad = true;
 		this.chooseSnippetMode = false;
 		this.chooseSnippetModeOverlay = document.querySelector("#choose-snippet-mode-overlay");
@@ -56,6 +71,30 @@ class Program {
 		return this.tracks.flatMap(track => track.snippets);
 	}
 	
+	recordChange(change) {
+		this.version++;
+		this.changes.push({ ...change, version: this.version });
+		if (change.op.includes("snippet")) {
+			this.dirtySnippetIds.add(change.op == "add_snippet" ? change.attrs.id : change.id);
+		}
+		this.invalidateIndex();
+	}
+	
+	sync() {
+		let version = this.version;
+		let patch = {
+			base: this.syncedVersion,
+			version: version,
+			changes: this.changes.filter(change => change.version > this.syncedVersion)
+		};
+		return pywebview.api.sync(patch)
+			.then(inSync => inSync || pywebview.api.reset(this.toJSON(), version))
+			.then(() => {
+				this.syncedVersion = version;
+				this.changes = this.changes.filter(change => change.version > version);
+			});
+	}
+	
 	get buttonPressPositions() {
 		return this.snippets.flatMap(snippet => {
 			let positions = [];
@@ -69,8 +108,80 @@ class Program {
 		});
 	}
 	
+	get index() {
+		if (this._index === null) {
+			let snippetsById = new Map();
+			let clones = new Map();
+			let startDependents = new Map();
+			for (let snippet of this.snippets) {
+				snippetsById.set(snippet.attrs.id, snippet);
+				if (snippet.attrs.source !== undefined && "ref" in snippet.attrs.source) {
+					let sourceId = snippet.attrs.source.ref.id;
+					clones.set(sourceId, [...(clones.get(sourceId) ?? []), snippet]);
+				}
+				for (let id of this.getReferencedIds(snippet.attrs.start)) {
+					startDependents.set(id, [...(startDependents.get(id) ?? []), snippet]);
+				}
+			}
+			this._index = { snippetsById, clones, startDependents };
+		}
+		return this._index;
+	}
+	
+	invalidateIndex() {
+		this._index = null;
+	}
+	
+	getReferencedIds(boundary) {
+		if (boundary === undefined) {
+			return [];
+		}
+		switch (Object.keys(boundary)[0]) {
+			case "ref":
+				return [boundary.ref.id];
+			case "calc":
+				return Object.values(boundary.calc)[0].flatMap(prop => this.getReferencedIds(prop));
+			default:
+				return [];
+		}
+	}
+	
 	getSnippetById(id) {
-		return this.snippets.find(snippet => snippet.attrs.id == id);
+		return this.index.snippetsById.get(id);
+	}
+	
+	getClones(snippet) {
+		return this.index.clones.get(snippet.attrs.id) ?? [];
+	}
+	
+	getSnippetX(snippet) {
+		// snippets that are still being created may change at any time, so their
+		// positions are not cached
+		if (!snippet.isAttached) {
+			return this.getBoundaryCoordinate(snippet.attrs.start) ?? 10;
+		}
+		if (!this.layoutCache.has(snippet)) {
+			this.layoutCache.set(snippet, this.getBoundaryCoordinate(snippet.attrs.start) ?? 10);
+		}
+		return this.layoutCache.get(snippet);
+	}
+	
+	collectAffectedSnippets(ids) {
+		// the given snippets plus all snippets whose start (transitively)
+		// depends on them
+		let affected = new Set();
+		let queue = [...ids];
+		while (queue.length > 0) {
+			let id = queue.pop();
+			let snippet = this.getSnippetById(id);
+			if (snippet !== undefined && !affected.has(snippet)) {
+				affected.add(snippet);
+				for (let dependent of this.index.startDependents.get(id) ?? []) {
+					queue.push(dependent.attrs.id);
+				}
+			}
+		}
+		return affected;
 	}
 	
 	getTrackById(id) {
@@ -111,6 +222,7 @@ class Program {
 		let track = new Track({ name: name, id: id }, []);
 		this.tracks.push(track);
 		track.containingProgram = this;
+		this.recordChange({ op: "add_track", attrs: { ...track.attrs } });
 		this.updateMixer();
 		this.updateWorkspace();
 	}
@@ -151,7 +263,7 @@ class Program {
 				break;
 			case "calc":
 				let [calculationType, props] = Object.entries(boundary.calc)[0];
-				let [prop1, prop2] = props.map(this.getBoundaryCoordinate);
+				let [prop1, prop2] = props.map(prop => this.getBoundaryCoordinate(prop));
 				switch (calculationType) {
 					case "add": return prop1 + prop2;
 					case "mul": return prop1 * prop2;
@@ -189,24 +301,110 @@ class Program {
 			if (this.workspaceContainer.contains(event.target)) {
 				this.mixerContainer.scrollTop = this.workspaceContainer.scrollTop;
 			}
+			this.scheduleVisibleSnippetsRender();
+		};
+		// a single handler for all snippets, since they are added and removed
+		// while scrolling
+		this.workspaceContainer.onclick = event => {
+			let container = event.target.closest(".snippet");
+			if (container !== null) {
+				this.getSnippetById(container.id).handleClick(event);
+			}
+		};
+	}
+	
+	get workspaceWidth() {
+		return Math.max(0, ...this.snippets.map(snippet => snippet.x2)) + 200;
+	}
+	
+	get workspaceHeight() {
+		return 5 + this.tracks.length * 110 + 110;
+	}
+	
+	get visibleArea() {
+		let margin = 400;
+		let container = this.workspaceContainer;
+		return {
+			left: container.scrollLeft - margin,
+			right: container.scrollLeft + container.clientWidth + margin,
+			top: container.scrollTop - margin,
+			bottom: container.scrollTop + container.clientHeight + margin
 		};
 	}
 	
+	isVisible(snippet, area) {
+		return snippet.x2 >= area.left && snippet.x <= area.right &&
+			snippet.y2 >= area.top && snippet.y <= area.bottom;
+	}
+	
+	scheduleVisibleSnippetsRender() {
+		if (!this.renderScheduled) {
+			this.renderScheduled = true;
+			window.requestAnimationFrame(() => {
+				this.renderScheduled = false;
+				this.renderVisibleSnippets();
+			});
+		}
+	}
+	
+	renderVisibleSnippets(affected = new Set()) {
+		let area = this.visibleArea;
+		// remove snippets that have been deleted, need to be re-rendered or are
+		// out of view
+		for (let [id, container] of this.renderedSnippets) {
+			let snippet = this.getSnippetById(id);
+			if (snippet === undefined || affected.has(snippet) ||
+				!this.isVisible(snippet, area) ||
+				container.classList.contains("recording") != snippet.recording) {
+				container.remove();
+				this.renderedSnippets.delete(id);
+			}
+		}
+		let newIds = [];
+		let html = "";
+		for (let track of this.tracks) {
+			if (track.y2 < area.top || track.y > area.bottom) {
+				continue;
+			}
+			for (let snippet of track.snippets) {
+				if (!this.renderedSnippets.has(snippet.attrs.id) && this.isVisible(snippet, area)) {
+					html += snippet.renderWorkspace();
+					newIds.push(snippet.attrs.id);
+				}
+			}
+		}
+		this.workspaceContainer.querySelector(".snippets").insertAdjacentHTML("beforeend", html);
+		for (let id of newIds) {
+			this.renderedSnippets.set(id, document.getElementById(id));
+		}
+	}
+	
 	renderMixer() {
 		return `
-			<svg>
+			<svg style="height: max(95%, 2000px, ${this.workspaceHeight}px)">
 				${this.tracks.map(track => track.renderMixer()).join("")}
 			</svg>
 		`;
 	}
 	
+	renderButtonPressIndicators() {
+		return this.buttonPressPositions.map(x => `
+			<line class="button-press-indicator" x1="${x}px" y1="0px" x2="${x}" y2="100%"/>
+		`).join("");
+	}
+	
+	get workspaceStyle() {
+		return `width: max(100%, 3000px, ${this.workspaceWidth}px); ` +
+			`height: max(95%, 2000px, ${this.workspaceHeight}px)`;
+	}
+	
 	renderWorkspace() {
+		// snippets are added by `renderVisibleSnippets`
 		return `
-			<svg>
-				${this.buttonPressPositions.map(x => `
-					<line class="button-press-indicator" x1="${x}px" y1="0px" x2="${x}" y2="100%"/>
-				`)}
+			<svg style="${this.workspaceStyle}">
+				<g class="button-press-indicators">${this.renderButtonPressIndicators()}</g>
 				${this.tracks.map(track => track.renderWorkspace()).join("")}
+				<g class="snippets"></g>
 			</svg>
 		`;
 	}
@@ -218,12 +416,28 @@ class Program {
 	}
 	
 	updateWorkspace() {
+		this.invalidateIndex();
+		this.layoutCache.clear();
+		this.renderedSnippets.clear();
+		this.dirtySnippetIds.clear();
 		this.workspaceContainer.innerHTML = this.renderWorkspace();
-		this.snippets.forEach(snippet => snippet.setTransformOrigin());
-		[...this.tracks, ...this.snippets].forEach(item => item.addHandlers());
+		this.renderVisibleSnippets();
 		this.addWorkspaceHandlers();
 	}
 	
+	updateChanged() {
+		// Like `updateWorkspace`, but only recompute and re-render the snippets
+		// that have changed since the last update and the ones depending on them
+		let affected = this.collectAffectedSnippets(this.dirtySnippetIds);
+		affected.forEach(snippet => this.layoutCache.delete(snippet));
+		this.dirtySnippetIds.clear();
+		this.workspaceContainer.querySelector("svg").setAttribute("style", this.workspaceStyle);
+		this.workspaceContainer.querySelector(".button-press-indicators").innerHTML =
+			this.renderButtonPressIndicators();
+		this.renderVisibleSnippets(affected);
+		this.infoPanel.update();
+	}
+	
 	updateAll() {
 		this.updateMixer();
 		this.updateWorkspace();
@@ -281,6 +495,9 @@ class Track {
 		let newName = prompt("Please enter a new name for this track:", this.attrs.name);
 		if (newName !== null) {
 			this.attrs.name = newName;
+			this.containingProgram.recordChange({
+				op: "set_track_attr", id: this.attrs.id, attr: "name", value: newName
+			});
 			this.containingProgram.updateMixer();
 		}
 	}
@@ -312,7 +529,6 @@ class Track {
 			<g class="track-workspace">
 				<line class="track-separator" x1="0px" y1="${this.y2}px"
 					x2="100%" y2="${this.y2}px"/>
-				${this.snippets.map(snippet => snippet.renderWorkspace()).join("")}
 			</g>
 		`;
 	}
@@ -332,17 +548,12 @@ class Snippet {
 		return this.attrs;
 	}
 	
-	setTransformOrigin() {
-		this.container.style.transformOrigin =
-			`${this.horizontalCenter}px ${this.verticalCenter}px`;
-	}
-	
 	get container() {
 		return document.getElementById(this.attrs.id);
 	}
 	
 	get x() {
-		return this.containingProgram.getBoundaryCoordinate(this.attrs.start) ?? 10;
+		return this.containingProgram.getSnippetX(this);
 	}
 	
 	get y() {
@@ -385,10 +596,7 @@ class Snippet {
 	}
 	
 	get clones() {
-		return this.containingProgram.snippets.filter(snippet =>
-			"ref" in snippet.attrs.source &&
-			snippet.attrs.source.ref.id == this.attrs.id
-		);
+		return [...this.containingProgram.getClones(this)];
 	}
 	
 	get isClone() {
@@ -420,7 +628,7 @@ class Snippet {
 	
 	set selected(value) {
 		if (value) {
-			this.container.classList.add("selected");
+			this.container?.classList.add("selected");
 			this.indirectlySelected = false;
 			this.relatives.forEach(relative => {
 				if (!relative.selected) {
@@ -429,7 +637,7 @@ class Snippet {
 			});
 			this._selected = true;
 		} else {
-			this.container.classList.remove("selected");
+			this.container?.classList.remove("selected");
 			if (!this.relatives.some(relative => relative.selected)) {
 				this.relatives.forEach(relative => {
 					relative.indirectlySelected = false;
@@ -444,35 +652,66 @@ class Snippet {
 	
 	set indirectlySelected(value) {
 		if (value) {
-			this.container.classList.add("indirectly-selected");
+			this.container?.classList.add("indirectly-selected");
 			this._indirectlySelected = true;
 		} else {
-			this.container.classList.remove("indirectly-selected");
+			this.container?.classList.remove("indirectly-selected");
 			this._indirectlySelected = false;
 		}
 	}
 	
+	get isAttached() {
+		return this.containingProgram.getSnippetById(this.attrs.id) === this;
+	}
+	
+	recordAttrChange(attr, value) {
+		// Snippets that haven't been added to a track yet are sent as a whole
+		// once they are, so there is no need to record changes before that
+		if (this.isAttached) {
+			this.containingProgram.recordChange({
+				op: "set_snippet_attr", id: this.attrs.id, attr: attr, value: value ?? null
+			});
+		}
+	}
+	
 	remove() {
+		if (this.isAttached) {
+			this.containingProgram.recordChange({ op: "remove_snippet", id: this.attrs.id });
+		}
 		this.containingTrack.removeSnippet(this);
 	}
 	
 	changeName(newName) {
 		this.attrs.name = newName;
+		this.recordAttrChange("name", newName);
 	}
 	
 	changeTrack(newTrack) {
+		let wasAttached = this.isAttached;
 		if (this.containingTrack != undefined) {
 			this.containingTrack.removeSnippet(this);
 		}
 		newTrack.addSnippet(this);
+		if (wasAttached) {
+			this.containingProgram.recordChange({
+				op: "move_snippet", id: this.attrs.id, track: newTrack.attrs.id
+			});
+		} else {
+			this.containingProgram.recordChange({
+				op: "add_snippet", track: newTrack.attrs.id,
+				attrs: JSON.parse(JSON.stringify(this.toObject()))
+			});
+		}
 	}
 	
 	changeSource(newSource) {
 		this.attrs.source = newSource;
+		this.recordAttrChange("source", newSource);
 	}
 	
 	changeStart(newStart) {
 		this.attrs.start = newStart;
+		this.recordAttrChange("start", newStart);
 	}
 	
 	changeDur(newDur) {
@@ -480,10 +719,13 @@ class Snippet {
 		switch (durType) {
 			case "ref":
 				this.attrs.dur = newDur;
+				this.recordAttrChange("dur", newDur);
 				break;
 			case "event":
 				this.attrs.end = newDur;
 				delete this.attrs.dur;
+				this.recordAttrChange("end", newDur);
+				this.recordAttrChange("dur", null);
 		}
 	}
 	
@@ -521,10 +763,6 @@ class Snippet {
 		}
 	}
 	
-	addHandlers() {
-		this.container.onclick = this.handleClick.bind(this);
-	}
-	
 	getCSSClasses() {
 		return "snippet " +
 			[[this.recording, "recording"],